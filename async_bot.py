@@ -0,0 +1,285 @@
+import os
+import sys
+import time
+import signal
+import atexit
+import asyncio
+import logging
+
+import vk_api
+from vk_api.bot_longpoll import VkBotLongPoll
+from vk_api.exceptions import ApiError, ApiHttpError
+
+import bot
+from async_http import AsyncHttpPool
+from dispatcher import Dispatcher
+from group_client import GroupClient
+from longpoll import LongPollConsumer
+
+logger = logging.getLogger(__name__)
+
+
+def in_loop(loop):
+    """Выполняется ли код в потоке цикла loop"""
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+class AsyncVkSession(vk_api.VkApiGroup):
+    """VkApi токена группы, запросы которого идут через AsyncHttpPool.
+
+    В цикле asyncio вызывается await call(). Синхронный method() (им пользуются
+    VkApiMethod, VkRequestsPool и очередь исходящих) из других потоков
+    передает запрос в цикл и ждет ответа: все запросы идут через один пул
+    keep-alive соединений. Пока цикл не запущен (например, при остановке),
+    method() работает как обычно, через requests.
+    """
+
+    API_URL = "https://api.vk.ru/method/"
+
+    def __init__(self, token, pool, timeout=30.0):
+        super().__init__(token=token)
+        self.pool = pool
+        self.timeout = timeout
+        self.loop = None
+        self._throttle = None
+
+    async def call(self, method, values=None, raw=False):
+        """Вызов метода API в цикле asyncio"""
+        values = dict(values or {})
+        values.setdefault("v", self.api_version)
+        if self.token:
+            values.setdefault("access_token", self.token["access_token"])
+
+        # Как у VkApiGroup: не чаще RPS_DELAY между началами запросов
+        if self._throttle is None:
+            self._throttle = asyncio.Lock()
+        async with self._throttle:
+            delay = self.RPS_DELAY - (time.time() - self.last_request)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.last_request = time.time()
+
+        response = await self.pool.request("POST", self.API_URL + method, data=values, timeout=self.timeout)
+        if not response.ok:
+            raise ApiHttpError(self, method, values, raw, response)
+        response = response.json()
+        if "error" in response:
+            raise ApiError(self, method, values, raw, response["error"])
+        return response if raw else response["response"]
+
+    def method(self, method, values=None, raw=False, **kwargs):
+        loop = self.loop
+        if loop is None or not loop.is_running():
+            return super().method(method, values, raw=raw, **kwargs)
+        if in_loop(loop):
+            # Ожидание ответа остановило бы сам цикл
+            raise RuntimeError("в цикле asyncio используйте await call()")
+        return asyncio.run_coroutine_threadsafe(self.call(method, values, raw), loop).result()
+
+
+class AsyncGroupLongPoll:
+    """Bots Long Poll одной группы на asyncio"""
+
+    def __init__(self, client, wait=25):
+        self.client = client
+        self.group_id = client.group_id
+        self.vk_session = client.vk_session
+        self.wait = wait
+        # LongPollConsumer группы: дубли, контрольная точка, задержки переподключения
+        self.consumer = None
+        self.server = None
+        self.key = None
+        self.ts = None
+
+    async def update_server(self, update_ts=True):
+        """Получение адреса и ключа long poll сервера"""
+        response = await self.vk_session.call("groups.getLongPollServer", {"group_id": self.group_id})
+        self.key = response["key"]
+        self.server = response["server"]
+        if update_ts:
+            self.ts = response["ts"]
+
+    async def check(self):
+        """Один запрос к long poll серверу (как VkBotLongPoll.check)"""
+        response = await self.vk_session.pool.request(
+            "GET", self.server,
+            params={"act": "a_check", "key": self.key, "ts": self.ts, "wait": self.wait},
+            timeout=self.wait + 10
+        )
+        response = response.json()
+
+        if "failed" not in response:
+            self.ts = response["ts"]
+            return [
+                VkBotLongPoll.CLASS_BY_EVENT_TYPE.get(raw["type"], VkBotLongPoll.DEFAULT_EVENT_CLASS)(raw)
+                for raw in response["updates"]
+            ]
+        elif response["failed"] == 1:
+            self.ts = response["ts"]
+        elif response["failed"] == 2:
+            await self.update_server(update_ts=False)
+        elif response["failed"] == 3:
+            await self.update_server()
+        return []
+
+
+def state_path(group_id):
+    """Файл контрольной точки long poll группы: у основной — LONGPOLL_STATE,
+    у дополнительных — с номером группы в имени"""
+    path = os.getenv("LONGPOLL_STATE", "longpoll_state.json")
+    if group_id == bot.GROUP_ID:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{group_id}{ext}"
+
+
+class AsyncRunner:
+    """Обслуживание нескольких групп в одном процессе на asyncio.
+
+    Long poll, вызовы API и исходящие всех групп идут через один пул
+    keep-alive соединений (pool_size). Обработчики bot.py синхронные (файлы,
+    Redis), поэтому выполняются в Dispatcher — том же пуле из workers потоков,
+    что и в bot.py: события одного пользователя группы по порядку, без
+    потока на каждое событие. Ответы уходят через GroupClient группы,
+    получившей событие. Позиция и обработанные event_id каждой группы
+    сохраняются LongPollConsumer в свой файл. leader — LeaderLock процесса
+    при STORAGE_BACKEND=redis: после его потери события не обрабатываются.
+    """
+
+    def __init__(self, groups, pool_size=32, workers=8, max_pending=1000, leader=None):
+        self.pool = AsyncHttpPool(pool_size, user_agent=vk_api.vk_api.DEFAULT_USERAGENT)
+        self.polls = []
+        for group_id, token in groups:
+            client = GroupClient(group_id, vk_session=AsyncVkSession(token, self.pool))
+            poll = AsyncGroupLongPoll(client)
+            poll.consumer = LongPollConsumer(
+                None,
+                state_path=state_path(group_id),
+                dedup_size=int(os.getenv("LONGPOLL_DEDUP_SIZE", "10000"))
+            )
+            poll.consumer.longpoll = poll
+            self.polls.append(poll)
+        self.leader = leader
+        self.dispatcher = Dispatcher(self._process, workers=workers, max_pending=max_pending)
+        self._stop = asyncio.Event()
+
+    @staticmethod
+    def _process(item):
+        poll, event = item
+        try:
+            bot.handle_event(event, poll.client)
+        finally:
+            poll.consumer.done(event)
+
+    async def _submit(self, poll, event):
+        key = (poll.group_id, bot.event_key(event))
+        # Заполненная очередь не блокирует цикл: обработчики ждут от него ответов API
+        while not self.dispatcher.submit(key, (poll, event), block=False):
+            await asyncio.sleep(0.01)
+
+    async def _poll(self, poll):
+        consumer = poll.consumer
+        # Отмена задачи может потеряться, если совпадет с завершением
+        # asyncio.wait_for, поэтому цикл проверяет и флаг остановки
+        while not self._stop.is_set():
+            try:
+                if poll.server is None:
+                    if consumer.resume_ts is not None and poll.ts is None:
+                        poll.ts = consumer.resume_ts
+                    await poll.update_server(update_ts=poll.ts is None)
+                    logger.info("Long poll группы %s подключен", poll.group_id)
+                ts_before = poll.ts
+                events = await poll.check()
+            except Exception as e:
+                # Новый ключ при следующей попытке, позиция ts сохраняется
+                poll.server = None
+                await asyncio.sleep(consumer.failed(f"группа {poll.group_id}: {e}"))
+                continue
+            if self.leader is not None and self.leader.lost.is_set():
+                # Ведущим стал другой процесс — выходим, чтобы не обработать события дважды
+                logger.error("Роль ведущего потеряна, остановка")
+                self.stop()
+                return
+            for event in consumer.accept(ts_before, events):
+                await self._submit(poll, event)
+            consumer.save_if_due()
+
+    def stop(self):
+        """Остановка run() (из цикла asyncio)"""
+        self._stop.set()
+
+    def _shutdown(self):
+        """Дообработка принятых событий, контрольные точки и отправка исходящих"""
+        self.dispatcher.shutdown()
+        for poll in self.polls:
+            poll.consumer.close()
+            poll.client.outbox.stop()
+
+    async def run(self):
+        """Long poll всех групп до stop() или SIGTERM"""
+        loop = asyncio.get_running_loop()
+        for poll in self.polls:
+            poll.vk_session.loop = loop
+        try:
+            loop.add_signal_handler(signal.SIGTERM, self.stop)
+        except (NotImplementedError, RuntimeError):
+            # Windows или цикл не в главном потоке
+            pass
+
+        tasks = [asyncio.create_task(self._poll(poll)) for poll in self.polls]
+        try:
+            await self._stop.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                loop.remove_signal_handler(signal.SIGTERM)
+            except (NotImplementedError, RuntimeError):
+                pass
+            # Обработчики и очереди исходящих отправляют запросы через этот цикл,
+            # поэтому он работает, пока они не закончат
+            await loop.run_in_executor(None, self._shutdown)
+            await self.pool.close()
+
+
+def parse_groups(value):
+    """Группы из строки вида "group_id:token,group_id:token" """
+    groups = []
+    for item in value.split(","):
+        if item.strip():
+            group_id, token = item.strip().split(":", 1)
+            groups.append((int(group_id), token))
+    return groups
+
+
+def main():
+    """Асинхронная точка входа: группа из .env и дополнительные из VK_GROUPS"""
+    bot.setup_logging()
+    bot.check_config()
+    bot.init()
+    leader = bot.join_cluster()
+    groups = [(bot.GROUP_ID, bot.TOKEN)] + parse_groups(os.getenv("VK_GROUPS", ""))
+    runner = AsyncRunner(
+        groups,
+        pool_size=int(os.getenv("ASYNC_CONCURRENCY", "32")),
+        workers=int(os.getenv("EVENT_WORKERS", "8")),
+        max_pending=int(os.getenv("EVENT_QUEUE_SIZE", "1000")),
+        leader=leader
+    )
+    # Запросы вне событий (имена пользователей, сводка) — через основную группу
+    bot.client = runner.polls[0].client
+    bot.session_expiry.start()
+    bot.digest.start()
+    atexit.register(bot.digest.stop)
+    bot.start_metrics(runner.dispatcher, outboxes=[poll.client.outbox for poll in runner.polls])
+    asyncio.run(runner.run())
+    if leader is not None and leader.lost.is_set():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import ssl
+import json
+import asyncio
+import logging
+from urllib.parse import urlsplit, urlencode
+
+logger = logging.getLogger(__name__)
+
+
+class HttpResponse:
+    """Ответ сервера: код, заголовки (имена в нижнем регистре) и тело"""
+
+    __slots__ = ("status_code", "headers", "content")
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncHttpPool:
+    """Пул keep-alive соединений HTTP/1.1 на asyncio.
+
+    Соединения к одному хосту переиспользуются, одновременно выполняется не
+    больше max_connections запросов. Поддерживаются ответы с Content-Length
+    и chunked (без сжатия) — этого достаточно для VK API и long poll.
+    Соединение, закрытое сервером во время простоя, заменяется новым, и
+    запрос повторяется один раз.
+    """
+
+    def __init__(self, max_connections=32, user_agent=None):
+        self.max_connections = max_connections
+        self.user_agent = user_agent
+        self._idle = {}  # (схема, хост, порт) -> [(reader, writer)]
+        self._limit = asyncio.Semaphore(max_connections)
+        self._ssl = ssl.create_default_context()
+
+    async def request(self, method, url, params=None, data=None, timeout=30.0):
+        """Запрос; data — поля формы (application/x-www-form-urlencoded)"""
+        parts = urlsplit(url)
+        https = parts.scheme == "https"
+        key = (parts.scheme, parts.hostname, parts.port or (443 if https else 80))
+        target = parts.path or "/"
+        query = "&".join(q for q in (parts.query, urlencode(params) if params else "") if q)
+        if query:
+            target += "?" + query
+
+        body = urlencode(data).encode("utf-8") if data is not None else b""
+        head = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc}", "Accept: */*", "Connection: keep-alive"]
+        if self.user_agent:
+            head.append(f"User-Agent: {self.user_agent}")
+        if data is not None:
+            head += ["Content-Type: application/x-www-form-urlencoded", f"Content-Length: {len(body)}"]
+        payload = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+        async with self._limit:
+            return await asyncio.wait_for(self._send(key, payload), timeout)
+
+    async def _send(self, key, payload):
+        while True:
+            connection = self._take_idle(key)
+            reused = connection is not None
+            if connection is None:
+                scheme, host, port = key
+                connection = await asyncio.open_connection(
+                    host, port, ssl=self._ssl if scheme == "https" else None)
+            reader, writer = connection
+            try:
+                writer.write(payload)
+                await writer.drain()
+                response, keep_alive = await self._read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if reused:
+                    logger.debug("Соединение %s:%s закрыто сервером, повтор: %s", key[1], key[2], e)
+                    continue
+                raise ConnectionError(f"Ошибка соединения с {key[1]}: {e!r}") from e
+            except BaseException:
+                # Таймаут или отмена посреди ответа: соединение в неизвестном состоянии
+                writer.close()
+                raise
+            if keep_alive:
+                self._idle.setdefault(key, []).append(connection)
+            else:
+                writer.close()
+            return response
+
+    def _take_idle(self, key):
+        connections = self._idle.get(key)
+        while connections:
+            reader, writer = connections.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        return None
+
+    @staticmethod
+    async def _read_response(reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("соединение закрыто")
+        version, status = status_line.decode("latin-1").split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if not size:
+                    # Завершающие заголовки не нужны
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            content = b"".join(chunks)
+        elif "content-length" in headers:
+            content = await reader.readexactly(int(headers["content-length"]))
+        else:
+            content = await reader.read()
+            keep_alive = False
+        return HttpResponse(int(status), headers, content), keep_alive
+
+    async def close(self):
+        """Закрытие простаивающих соединений"""
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
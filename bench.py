@@ -0,0 +1,128 @@
+"""Нагрузочный тест обработчиков бота без обращения к VK.
+
+Пример: python bench.py --events 5000 --roster 500 --workers 8 --latency 0.005
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+
+# Каталог с bot.py — для запуска из любой папки
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, fraction):
+    """Перцентиль отсортированного списка"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def prepare_bot(workdir, management_ids, env=None):
+    """Импорт bot.py в пустом рабочем каталоге (файлы состояния создаются в нем)"""
+    os.chdir(workdir)
+    with open("management.json", "w", encoding="utf-8") as f:
+        json.dump(list(management_ids), f)
+    os.environ.setdefault("VK_TOKEN", "fake")
+    os.environ.setdefault("GROUP_ID", "1")
+    # Фейковое API не ограничивает частоту — не ждем и мы
+    os.environ.setdefault("OUTBOX_RATE", "100000")
+    for key, value in (env or {}).items():
+        os.environ[key] = value
+
+    import bot
+    logging.getLogger().setLevel(logging.WARNING)
+    bot.init()
+    return bot
+
+
+def attach_fake_api(bot, fake):
+    """Подключение FakeVkApi вместо настоящей сессии"""
+    from group_client import GroupClient
+
+    bot.client = GroupClient(bot.GROUP_ID, vk_session=fake)
+    bot.client.outbox.backoff = 0.01
+
+
+def run(events, bot, workers=0, rate=0):
+    """Прогон событий через обработчики; возвращает задержки (с) и общее время"""
+    from dispatcher import Dispatcher
+    from fake_vk import FakeLongPoll
+
+    latencies = []
+    lock = threading.Lock()
+
+    def timed_handler(event):
+        started = time.perf_counter()
+        bot.handle_event(event)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    longpoll = FakeLongPoll(events, rate=rate)
+    started = time.perf_counter()
+    if workers:
+        dispatcher = Dispatcher(timed_handler, workers=workers)
+        for event in longpoll.listen():
+            dispatcher.submit(bot.event_key(event), event)
+        dispatcher.shutdown()
+    else:
+        for event in longpoll.listen():
+            timed_handler(event)
+    handled = time.perf_counter() - started
+
+    # Дожидаемся отправки исходящих
+    bot.client.outbox.stop(timeout=60)
+    return sorted(latencies), handled, time.perf_counter() - started
+
+
+def report(latencies, handled, total, fake, outbox_stats):
+    """Текстовый отчет"""
+    count = len(latencies)
+    lines = [
+        f"Событий: {count}",
+        f"Обработка: {handled:.3f} с ({count / handled if handled else 0:.1f} событий/с)",
+        f"С отправкой исходящих: {total:.3f} с",
+        f"Задержка обработчика: p50 {percentile(latencies, 0.5) * 1000:.3f} мс, "
+        f"p99 {percentile(latencies, 0.99) * 1000:.3f} мс, max {(latencies[-1] if latencies else 0) * 1000:.3f} мс",
+        f"Запросов к API: {fake.total_calls} ({fake.total_calls / count if count else 0:.3f} на событие)",
+        f"Сообщений отправлено: {fake.sent_messages}",
+    ]
+    for method, calls in fake.calls.most_common():
+        lines.append(f"  {method}: {calls}")
+    lines.append(f"Исходящие: {outbox_stats}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на фейковом VK API")
+    parser.add_argument("--events", type=int, default=2000, help="количество событий")
+    parser.add_argument("--roster", type=int, default=200, help="количество пользователей")
+    parser.add_argument("--management", type=int, default=3, help="количество руководителей")
+    parser.add_argument("--rate", type=float, default=0, help="событий в секунду (0 — без ограничения)")
+    parser.add_argument("--workers", type=int, default=0, help="потоков обработки (0 — последовательно)")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа API, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ошибок API")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    from fake_vk import FakeVkApi, synthetic_events
+
+    management_ids = list(range(1, args.management + 1))
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    bot = prepare_bot(workdir, management_ids)
+    fake = FakeVkApi(latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    attach_fake_api(bot, fake)
+
+    events = list(synthetic_events(args.events, args.roster, management_ids, seed=args.seed))
+    latencies, handled, total = run(events, bot, workers=args.workers, rate=args.rate)
+    print(report(latencies, handled, total, fake, bot.client.outbox.stats()))
+    print(f"Рабочий каталог: {workdir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Память на записи сессий: словари против Session.
+
+Пример: python bench_memory.py --users 50000 --names 300
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+# Каталог с session.py — для запуска из любой папки
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from session import Session
+
+
+def synthetic_names(count, seed):
+    """Пары (имя, фамилия) из небольшого словаря — имена повторяются, как в жизни"""
+    rng = random.Random(seed)
+    first = [f"Имя{i}" for i in range(count)]
+    last = [f"Фамилия{i}" for i in range(count)]
+    return lambda: (rng.choice(first), rng.choice(last))
+
+
+def measure(build):
+    """Пиковый прирост памяти (байт) при построении структуры"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    data = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return data, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Память на записи сессий")
+    parser.add_argument("--users", type=int, default=50000, help="количество сессий")
+    parser.add_argument("--names", type=int, default=300, help="различных имен и фамилий")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    now = time.time()
+
+    def raw_records():
+        # Как после json.load: каждая строка имени — отдельный объект
+        pick = synthetic_names(args.names, args.seed)
+        records = {}
+        for uid in range(args.users):
+            first_name, last_name = pick()
+            records[str(uid)] = json.loads(json.dumps(
+                {"start_time": now - uid, "first_name": first_name, "last_name": last_name}))
+        return records
+
+    def as_dicts():
+        return raw_records()
+
+    def as_sessions():
+        return {uid: Session.from_dict(info) for uid, info in raw_records().items()}
+
+    _, dict_bytes = measure(as_dicts)
+    _, session_bytes = measure(as_sessions)
+    print(f"Сессий: {args.users}, различных имен: {args.names}")
+    print(f"Словари: {dict_bytes / 1024 / 1024:.1f} МБ ({dict_bytes / args.users:.0f} байт на сессию)")
+    print(f"Session: {session_bytes / 1024 / 1024:.1f} МБ ({session_bytes / args.users:.0f} байт на сессию)")
+    if session_bytes:
+        print(f"Экономия: {dict_bytes / session_bytes:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Микротесты разбора payload и диспетчеризации сообщения.
+
+Пример: python bench_payload.py --number 100000
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import tempfile
+import timeit
+
+# Каталог с bot.py — для запуска из любой папки
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def report(name, seconds, number):
+    return f"{name:<36} {seconds / number * 1e6:8.2f} мкс"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Микротесты разбора payload")
+    parser.add_argument("--number", type=int, default=100000, help="повторов каждого теста")
+    parser.add_argument("--repeat", type=int, default=5, help="серий (берется лучшая)")
+    args = parser.parse_args(argv)
+
+    from bench import prepare_bot, attach_fake_api
+    from fake_vk import FakeVkApi
+
+    bot = prepare_bot(tempfile.mkdtemp(prefix="bot-bench-"), [1])
+    attach_fake_api(bot, FakeVkApi())
+    logging.getLogger().setLevel(logging.CRITICAL)
+    decoder = bot.payload_decoder
+
+    known = bot.button_payload("junior_admins")
+    page = json.dumps({"command": "junior_admins", "page": 2})
+    oversized = json.dumps({"command": "x" * (decoder.max_size + 1)})
+    message = {"from_id": 1, "peer_id": 1, "text": "", "payload": known}
+
+    cases = [
+        ("json.loads (известная кнопка)", lambda: json.loads(known)),
+        ("decode (известная кнопка)", lambda: decoder.decode(known)),
+        ("decode (листание)", lambda: decoder.decode(page)),
+        ("decode (слишком длинный)", lambda: decoder.decode(oversized)),
+        ("decode (битый)", lambda: decoder.decode("{command")),
+        ("parse_payload + dispatch_action", lambda: bot.router.dispatch_action(
+            bot.parse_payload(message)["command"], bot.Request(1, "1", "", payload=None))),
+    ]
+    for name, case in cases:
+        # На тяжелом последнем тесте меньше повторов
+        number = args.number if "dispatch" not in name else max(1, args.number // 20)
+        best = min(timeit.repeat(case, number=number, repeat=args.repeat))
+        print(report(name, best, number))
+    bot.client.outbox.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,179 +1,375 @@
 import os
+import sys
+import re
 import json
 import time
+import atexit
+import signal
 import logging
-import ast
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Начало импорта — для отчета о времени запуска
+_import_started = time.perf_counter()
+
 from dotenv import load_dotenv
 import vk_api
 from vk_api.bot_longpoll import VkBotLongPoll, VkBotEventType
 from vk_api.keyboard import VkKeyboard, VkKeyboardColor
 from vk_api.utils import get_random_id
+from user_cache import UserCache
+from storage import open_storage
+from roles import RoleRegistry
+from dispatcher import Dispatcher
+from group_client import GroupClient
+from expiry import ExpiryScheduler
+from router import CommandRouter, Request
+from metrics import metrics
+from longpoll import LongPollConsumer
+from logging_setup import configure_logging, current_event
+from roster import Roster
+from history import ShiftHistory
+from session import Session
+from payload import PayloadDecoder, MAX_PAYLOAD_SIZE
+from digest import DigestScheduler
+from recorder import EventRecorder
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-# Создаем папку для логов
-os.makedirs("logs", exist_ok=True)
+# Обработчик очереди логов (после setup_logging)
+log_handler = None
+
+def setup_logging():
+    """Настройка логирования (вызывается из main: при импорте модуля как
+    библиотеки обработчики не добавляются).
+
+    Записи уходят в очередь, файл logs/bot.log пишет фоновый поток.
+    LOG_LEVEL — уровень, LOG_JSON=1 — JSON-строки в файле, ротация по
+    размеру (LOG_MAX_BYTES, LOG_BACKUPS) или по времени (LOG_ROTATE_WHEN).
+    """
+    global log_handler
+    log_handler = configure_logging(
+        "logs/bot.log",
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        json_format=os.getenv("LOG_JSON") == "1",
+        max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        backup_count=int(os.getenv("LOG_BACKUPS", "5")),
+        rotate_when=os.getenv("LOG_ROTATE_WHEN") or None
+    )
 
 # ==== Загрузка токена и GROUP_ID ====
 load_dotenv()
 TOKEN = os.getenv("VK_TOKEN")
 GROUP_ID = os.getenv("GROUP_ID")
 
-if not TOKEN:
-    logger.error("Не указан VK_TOKEN в файле .env")
-    exit(1)
-
 try:
     GROUP_ID = int(GROUP_ID) if GROUP_ID else 0
 except ValueError:
-    logger.error("GROUP_ID должен быть числом")
-    exit(1)
+    GROUP_ID = None
+
+def check_config():
+    """Проверка токена и GROUP_ID перед подключением к VK"""
+    if not TOKEN:
+        logger.error("Не указан VK_TOKEN в файле .env")
+        exit(1)
+
+    if GROUP_ID is None:
+        logger.error("GROUP_ID должен быть числом")
+        exit(1)
+
+    if GROUP_ID == 0:
+        logger.error("Не указан GROUP_ID в файле .env")
+        exit(1)
+
+# Подключение к VK группы GROUP_ID (сессия, API, очередь исходящих)
+# создается при первом обращении, а не при импорте
+client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Клиент VK группы GROUP_ID"""
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                created = GroupClient(GROUP_ID, TOKEN)
+                # Отправляем оставшиеся сообщения при остановке
+                atexit.register(created.outbox.stop)
+                client = created
+    return client
 
-if GROUP_ID == 0:
-    logger.error("Не указан GROUP_ID в файле .env")
-    exit(1)
+def fetch_users(user_ids, fields=None):
+    """Запрос users.get (для кэша имен)"""
+    vk = get_client().vk
+    with metrics.timer("vk_api_request_seconds", method="users.get"):
+        try:
+            if fields:
+                return vk.users.get(user_ids=user_ids, fields=fields)
+            return vk.users.get(user_ids=user_ids)
+        except vk_api.ApiError as e:
+            metrics.inc("vk_api_errors_total", code=e.code)
+            raise
 
-# Инициализация VK сессии
-vk_session = vk_api.VkApi(token=TOKEN)
-vk = vk_session.get_api()
-longpoll = VkBotLongPoll(vk_session, GROUP_ID)
+# Кэш имен пользователей (общий для списков, команд и входа)
+user_cache = UserCache(
+    fetch_users,
+    ttl=int(os.getenv("USER_CACHE_TTL", "3600")),
+    max_size=int(os.getenv("USER_CACHE_SIZE", "5000"))
+)
 
 # Файлы для хранения данных
 admins_file = "admins.json"
 senior_admins_file = "senior_admins.json"
 management_file = "management.json"
 
-# Загружаем младших администраторов
-if os.path.exists(admins_file):
-    with open(admins_file, "r", encoding="utf-8") as f:
-        admins = json.load(f)
-    logger.info(f"Загружено {len(admins)} младших администраторов")
-else:
-    admins = {}
-    logger.info("Файл admins.json не найден, создан пустой словарь")
-
-# Загружаем старших администраторов
-if os.path.exists(senior_admins_file):
-    with open(senior_admins_file, "r", encoding="utf-8") as f:
-        senior_admins = json.load(f)
-    logger.info(f"Загружено {len(senior_admins)} старших администраторов")
-else:
-    senior_admins = []
-    logger.info("Файл senior_admins.json не найден, создан пустой список")
-
-# Загружаем руководство
-if os.path.exists(management_file):
-    with open(management_file, "r", encoding="utf-8") as f:
-        management = json.load(f)
-    logger.info(f"Загружено {len(management)} руководства")
-else:
-    management = []
-    logger.info("Файл management.json не найден, создан пустой список")
-
-def save_admins():
-    """Сохранение младших администраторов"""
-    with open(admins_file, "w", encoding="utf-8") as f:
-        json.dump(admins, f, ensure_ascii=False, indent=2)
-    logger.debug("Файл admins.json сохранен")
+# Хранилище: STORAGE_BACKEND=json (по умолчанию) или sqlite (файл SQLITE_PATH).
+# Для JSON изменения объединяются за STORAGE_FLUSH_DELAY секунд или до
+# STORAGE_MAX_PENDING штук. STORAGE_JOURNAL=1 включает журнал для admins.json
+# (вход/выход — одна дописанная строка вместо полной записи).
+# STORAGE_BACKEND=redis — общее состояние нескольких процессов (REDIS_URL).
+storage_backend = os.getenv("STORAGE_BACKEND", "json")
+
+def open_state_storage():
+    """Хранилище состояния по STORAGE_BACKEND"""
+    if storage_backend == "sqlite":
+        return open_storage("sqlite", path=os.getenv("SQLITE_PATH", "bot.db"))
+    if storage_backend == "redis":
+        return open_storage(
+            "redis",
+            url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            prefix=os.getenv("REDIS_PREFIX", "vkbot:")
+        )
+    return open_storage(
+        storage_backend,
+        admins_file=admins_file,
+        senior_admins_file=senior_admins_file,
+        management_file=management_file,
+        delay=float(os.getenv("STORAGE_FLUSH_DELAY", "1.0")),
+        max_pending=int(os.getenv("STORAGE_MAX_PENDING", "50")),
+        journal=os.getenv("STORAGE_JOURNAL") == "1",
+        compact_every=int(os.getenv("STORAGE_COMPACT_EVERY", "1000"))
+    )
+
+# Состояние загружается в init() при первом обращении; реестр ролей
+# (ID приводятся к int) создается последним и служит признаком готовности
+storage = None
+admins = senior_admins = management = None
+roles = None
+
+# Блокировка общего состояния (admins, списки ролей, счетчики) для пула потоков
+state_lock = threading.RLock()
 
+def initialized(func):
+    """Функция работает с состоянием: при первом вызове оно загружается (init)"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if roles is None:
+            init()
+        return func(*args, **kwargs)
+    return wrapper
+
+@initialized
+def save_admins(*user_ids):
+    """Сохранение младших администраторов (user_ids — изменившиеся записи, без них — все)"""
+    with metrics.timer("bot_save_seconds", store="admins"):
+        storage.save_admins(admins, user_ids or None)
+
+@initialized
 def save_senior_admins():
     """Сохранение старших администраторов"""
-    with open(senior_admins_file, "w", encoding="utf-8") as f:
-        json.dump(senior_admins, f, ensure_ascii=False, indent=2)
-    logger.debug("Файл senior_admins.json сохранен")
+    with metrics.timer("bot_save_seconds", store="senior_admins"):
+        storage.save_role("senior_admins", senior_admins)
 
+@initialized
 def save_management():
     """Сохранение руководства"""
-    with open(management_file, "w", encoding="utf-8") as f:
-        json.dump(management, f, ensure_ascii=False, indent=2)
-    logger.debug("Файл management.json сохранен")
+    with metrics.timer("bot_save_seconds", store="management"):
+        storage.save_role("management", management)
+
+# ==== Синхронизация с другими процессами (STORAGE_BACKEND=redis) ====
+# Поток применения чужих изменений: в нем смены не записываются в историю
+syncing = threading.local()
+
+@initialized
+def apply_remote_change(kind, user_id=None):
+    """Изменение из другого процесса: перечитываем затронутые данные из хранилища"""
+    syncing.active = True
+    try:
+        with state_lock:
+            if kind == "session":
+                info = storage.load_session(user_id)
+                if info is None:
+                    roles.remove("junior", user_id)
+                elif not roles.has("junior", user_id):
+                    roles.add("junior", user_id, info)
+            elif kind == "sessions":
+                remote = storage.load_sessions()
+                for uid in set(admins) - set(remote):
+                    roles.remove("junior", uid)
+                for uid, info in remote.items():
+                    if not roles.has("junior", uid):
+                        roles.add("junior", uid, info)
+            else:
+                role = "senior" if kind == "senior_admins" else "management"
+                remote = storage.load_role(kind)
+                for uid in set(roles.members(role)) - set(remote):
+                    roles.remove(role, uid)
+                for uid in remote:
+                    roles.add(role, uid)
+    finally:
+        syncing.active = False
+
+@initialized
+def join_cluster():
+    """Несколько процессов с общим Redis: все получают изменения состояния,
+    long poll читает только ведущий, остальные ждут его отказа.
+
+    Возвращает LeaderLock, когда процесс стал ведущим (для локальных
+    хранилищ — None). Если роль потеряна, истечение сессий и сводка
+    останавливаются сразу, не дожидаясь выхода процесса.
+    """
+    if storage_backend != "redis":
+        return None
+    storage.subscribe(apply_remote_change)
+    for kind in ("sessions", *storage.ROLES):
+        apply_remote_change(kind)
+
+    def on_lost():
+        session_expiry.stop()
+        digest.stop()
+
+    leader = storage.leader_lock(ttl=float(os.getenv("LEADER_TTL", "30")), on_lost=on_lost)
+    logger.info("Ожидание роли ведущего процесса")
+    leader.acquire()
+    atexit.register(leader.release)
+    logger.info("Процесс стал ведущим")
+    return leader
 
 # ==== Проверка прав пользователя ====
+@initialized
 def is_management(user_id):
     """Проверка, является ли пользователь руководством"""
-    return str(user_id) in [str(m) for m in management]
+    return roles.has("management", user_id)
 
+@initialized
 def is_senior_admin(user_id):
     """Проверка, является ли пользователь старшим администратором"""
-    return str(user_id) in [str(sa) for sa in senior_admins]
+    return roles.has("senior", user_id)
 
+@initialized
 def is_junior_admin(user_id):
     """Проверка, является ли пользователь младшим администратором"""
-    return str(user_id) in admins
+    return roles.has("junior", user_id)
 
+@initialized
 def get_user_role(user_id):
     """Получение роли пользователя"""
-    if is_management(user_id):
-        return "management"
-    elif is_senior_admin(user_id):
-        return "senior"
-    elif is_junior_admin(user_id):
-        return "junior"
-    return "none"
+    return roles.role_of(user_id)
 
 # ==== Клавиатура ====
-def get_keyboard(user_id=None):
-    """Создание клавиатуры в зависимости от роли"""
-    keyboard = VkKeyboard(one_time=False)
-    role = get_user_role(user_id) if user_id else "none"
-    
-    # Основные кнопки для всех с payload
-    keyboard.add_button("✅ Вошел", VkKeyboardColor.POSITIVE, 
-                       payload=json.dumps({"command": "entered"}))
-    keyboard.add_button("❌ Вышел", VkKeyboardColor.NEGATIVE, 
-                       payload=json.dumps({"command": "exited"}))
-    keyboard.add_line()
-    
+# Описание раскладок: строки кнопок (текст, цвет, команда payload)
+BASE_KEYBOARD_ROWS = [
+    # Основные кнопки для всех
+    [("✅ Вошел", VkKeyboardColor.POSITIVE, "entered"),
+     ("❌ Вышел", VkKeyboardColor.NEGATIVE, "exited")],
     # Кнопки для просмотра списков
-    keyboard.add_button("👥 Мл. админы", VkKeyboardColor.SECONDARY, 
-                       payload=json.dumps({"command": "junior_admins"}))
-    keyboard.add_button("👤 Ст. админы", VkKeyboardColor.PRIMARY, 
-                       payload=json.dumps({"command": "senior_admins"}))
-    keyboard.add_line()
-    keyboard.add_button("👑 Руководство", VkKeyboardColor.PRIMARY, 
-                       payload=json.dumps({"command": "management"}))
-    
-    # Дополнительные кнопки для руководства
-    if role == "management":
-        keyboard.add_line()
-        keyboard.add_button("➕ Дать мл.админа", VkKeyboardColor.POSITIVE, 
-                          payload=json.dumps({"command": "add_junior"}))
-        keyboard.add_button("➖ Убрать мл.админа", VkKeyboardColor.NEGATIVE, 
-                          payload=json.dumps({"command": "remove_junior"}))
-        keyboard.add_line()
-        keyboard.add_button("➕ Дать ст.админа", VkKeyboardColor.POSITIVE, 
-                          payload=json.dumps({"command": "add_senior"}))
-        keyboard.add_button("➖ Убрать ст.админа", VkKeyboardColor.NEGATIVE, 
-                          payload=json.dumps({"command": "remove_senior"}))
-        keyboard.add_line()
-        keyboard.add_button("➕ Дать руководство", VkKeyboardColor.POSITIVE, 
-                          payload=json.dumps({"command": "add_management"}))
-        keyboard.add_button("➖ Убрать руководство", VkKeyboardColor.NEGATIVE, 
-                          payload=json.dumps({"command": "remove_management"}))
-    
+    [("👥 Мл. админы", VkKeyboardColor.SECONDARY, "junior_admins"),
+     ("👤 Ст. админы", VkKeyboardColor.PRIMARY, "senior_admins")],
+    [("👑 Руководство", VkKeyboardColor.PRIMARY, "management")],
+]
+
+# Дополнительные кнопки для руководства
+MANAGEMENT_KEYBOARD_ROWS = BASE_KEYBOARD_ROWS + [
+    [("➕ Дать мл.админа", VkKeyboardColor.POSITIVE, "add_junior"),
+     ("➖ Убрать мл.админа", VkKeyboardColor.NEGATIVE, "remove_junior")],
+    [("➕ Дать ст.админа", VkKeyboardColor.POSITIVE, "add_senior"),
+     ("➖ Убрать ст.админа", VkKeyboardColor.NEGATIVE, "remove_senior")],
+    [("➕ Дать руководство", VkKeyboardColor.POSITIVE, "add_management"),
+     ("➖ Убрать руководство", VkKeyboardColor.NEGATIVE, "remove_management")],
+]
+
+KEYBOARD_LAYOUTS = {
+    "default": BASE_KEYBOARD_ROWS,
+    "management": MANAGEMENT_KEYBOARD_ROWS,
+}
+
+# Готовые JSON-строки клавиатур по имени раскладки
+keyboard_cache = {}
+
+# Разбор payload: строки кнопок клавиатур узнаются по таблице
+payload_decoder = PayloadDecoder(int(os.getenv("PAYLOAD_MAX_SIZE", str(MAX_PAYLOAD_SIZE))))
+
+def button_payload(command):
+    """Payload кнопки действия (одна строка и для клавиатуры, и для таблицы разбора)"""
+    return json.dumps({"command": command})
+
+def build_keyboard(rows):
+    """Сборка JSON клавиатуры по описанию раскладки"""
+    keyboard = VkKeyboard(one_time=False)
+    for i, row in enumerate(rows):
+        if i:
+            keyboard.add_line()
+        for text, color, command in row:
+            keyboard.add_button(text, color, payload=button_payload(command))
     return keyboard.get_keyboard()
 
+def build_keyboards():
+    """Сборка кэша клавиатур (в init(): раскладки не зависят от ролей, собираются один раз)"""
+    global keyboard_cache
+    keyboard_cache = {name: build_keyboard(rows) for name, rows in KEYBOARD_LAYOUTS.items()}
+    payload_decoder.set_known(button_payload(command) for rows in KEYBOARD_LAYOUTS.values()
+                              for row in rows for _, _, command in row)
+    logger.debug("Собрано клавиатур: %s", len(keyboard_cache))
+
+def get_keyboard_layout(user_id=None):
+    """Имя раскладки клавиатуры для пользователя"""
+    if user_id and get_user_role(user_id) == "management":
+        return "management"
+    return "default"
+
+@initialized
+def get_keyboard(user_id=None):
+    """Клавиатура в зависимости от роли (из кэша)"""
+    return keyboard_cache[get_keyboard_layout(user_id)]
+
 # ==== Отправка сообщений ====
-def send_message(peer_id, message, user_id=None):
-    """Отправка сообщения с клавиатурой"""
-    try:
-        vk.messages.send(
-            peer_id=peer_id,
-            message=message,
-            random_id=get_random_id(),
-            keyboard=get_keyboard(user_id)
-        )
-    except Exception as e:
-        logger.error(f"Ошибка отправки сообщения: {e}")
+@initialized
+def send_message(peer_id, message, user_id=None, keyboard=None, client=None):
+    """Отправка сообщения с клавиатурой (keyboard — inline-клавиатура к этому сообщению).
+    client — группа, от имени которой отправляется сообщение (по умолчанию GROUP_ID)"""
+    client = client or get_client()
+    layout = get_keyboard_layout(user_id)
+    params = {
+        "peer_id": peer_id,
+        "message": message,
+        "random_id": get_random_id()
+    }
+    on_done = None
+    if keyboard is not None:
+        # Inline-клавиатура не заменяет основную, раскладку беседы не трогаем
+        params["keyboard"] = keyboard
+    elif client.peer_keyboards.get(peer_id) != layout:
+        params["keyboard"] = keyboard_cache[layout]
+        # Раскладка запоминается после доставки (в потоке очереди исходящих)
+        on_done = functools.partial(client.peer_keyboards.__setitem__, peer_id, layout)
+    metrics.inc("bot_messages_total", keyboard="keyboard" in params)
+    # random_id задан заранее, поэтому повтор после ошибки не создаст дубль
+    client.outbox.send("messages.send", params, on_done=on_done)
+
+@functools.lru_cache(maxsize=256)
+def get_page_keyboard(command, page, pages):
+    """Inline-кнопки листания списка (None, если страница одна)"""
+    if pages <= 1:
+        return None
+    keyboard = VkKeyboard(inline=True)
+    if page > 1:
+        keyboard.add_button("◀️ Назад", VkKeyboardColor.SECONDARY,
+                            payload=json.dumps({"command": command, "page": page - 1}))
+    if page < pages:
+        keyboard.add_button("Вперед ▶️", VkKeyboardColor.SECONDARY,
+                            payload=json.dumps({"command": command, "page": page + 1}))
+    return keyboard.get_keyboard()
 
 # ==== Красивое время онлайн ====
 def format_time(seconds):
@@ -192,16 +388,12 @@ def format_time(seconds):
 # ==== Получение имени пользователя ====
 def get_user_info(user_id):
     """Получение имени и фамилии пользователя"""
-    try:
-        user = vk.users.get(user_ids=user_id)[0]
-        return user["first_name"], user["last_name"]
-    except Exception as e:
-        logger.error(f"Ошибка получения информации о пользователе {user_id}: {e}")
-        return "Неизвестно", "Неизвестно"
+    return user_cache.get(user_id)
 
 # ==== Парсинг пользователя из текста ====
-def parse_user_input(input_text):
-    """Парсит ввод пользователя (ссылку или ID) и возвращает user_id"""
+def parse_user_ref(input_text):
+    """Разбор ссылки на пользователя без запросов к VK:
+    ("id", "123"), ("screen", "durov") или None"""
     input_text = input_text.strip()
     
     # Убираем @ если есть
@@ -210,392 +402,753 @@ def parse_user_input(input_text):
     
     # Проверяем формат [id123|Name]
     if input_text.startswith('[id') and '|' in input_text:
-        try:
-            user_id = input_text.split('[id')[1].split('|')[0]
-            return user_id
-        except:
-            pass
+        user_id = input_text.split('[id')[1].split('|')[0]
+        return ("id", user_id) if user_id.isdigit() else None
     
-    # Проверяем ссылку vk.com/id123
+    # Проверяем ссылку vk.com/id123 или vk.com/screen_name
     if 'vk.com/' in input_text:
-        try:
-            parts = input_text.split('vk.com/')[1].split('/')[0]
-            if parts.startswith('id'):
-                return parts[2:]
-            else:
-                users = vk.users.get(user_ids=parts)
-                if users:
-                    return str(users[0]['id'])
-        except:
-            pass
+        parts = input_text.split('vk.com/')[1].split('/')[0]
+        # vk.com/idol_fan — короткое имя, а не ID
+        if parts.startswith('id') and parts[2:].isdigit():
+            return "id", parts[2:]
+        if parts:
+            return "screen", parts
     
     # Проверяем просто число
     if input_text.isdigit():
-        return input_text
+        return "id", input_text
     
     return None
 
+def parse_user_input(input_text):
+    """Парсит ввод пользователя (ссылку или ID) и возвращает user_id"""
+    ref = parse_user_ref(input_text)
+    if ref is None:
+        return None
+    kind, value = ref
+    if kind == "id":
+        return value if value.isdigit() else None
+    resolved_id = user_cache.resolve(value)
+    return str(resolved_id) if resolved_id else None
+
+# Ссылки в списке: тег [id123|Имя Фамилия] или слово без пробелов и запятых
+USER_TOKEN_RE = re.compile(r"\[id\d+\|[^\]]*\]|[^\s,;]+")
+
+def resolve_user_refs(text):
+    """ID пользователей из списка ссылок и ID; короткие имена распознаются
+    одним users.get. Возвращает (ID без повторов, нераспознанные строки)"""
+    refs = []
+    unknown = []
+    for token in USER_TOKEN_RE.findall(text):
+        ref = parse_user_ref(token)
+        if ref is None:
+            unknown.append(token)
+        else:
+            refs.append((token, ref))
+
+    resolved = user_cache.resolve_many([value for _, (kind, value) in refs if kind == "screen"])
+    user_ids = []
+    seen = set()
+    for token, (kind, value) in refs:
+        user_id = int(value) if kind == "id" else resolved.get(value.lower())
+        if user_id is None:
+            unknown.append(token)
+        elif user_id not in seen:
+            seen.add(user_id)
+            user_ids.append(user_id)
+    return user_ids, unknown
+
 # ==== Список младших админов онлайн ====
-def get_junior_admins_list():
-    """Получение списка младших администраторов онлайн"""
-    if not admins:
-        return "👥 Младшие администраторы в сети:\n\nСейчас никто не авторизован."
+# Строки списка готовятся при входе/выходе (roster), при выводе
+# пересчитывается только время; страницы по ROSTER_PAGE_SIZE строк
+roster = Roster(format_time, page_size=int(os.getenv("ROSTER_PAGE_SIZE", "40")))
 
-    now = time.time()
-    result = []
-    for i, (uid, info) in enumerate(admins.items(), start=1):
-        first_name = info.get("first_name", "Неизвестно")
-        last_name = info.get("last_name", "Неизвестно")
-        online_time = now - info.get("start_time", now)
-        result.append(f"{i}. [id{uid}|{first_name} {last_name}] — ⏱ {format_time(online_time)}")
-    
-    return "👥 Младшие администраторы в сети:\n\n" + "\n".join(result)
+@initialized
+def get_junior_admins_page(page=1):
+    """Страница списка младших администраторов онлайн: (текст, страница, всего страниц)"""
+    lines, page, pages = roster.render_page(page, time.time())
+    if not lines:
+        return "👥 Младшие администраторы в сети:\n\nСейчас никто не авторизован.", 1, 1
+
+    text = "👥 Младшие администраторы в сети:\n\n" + "\n".join(lines)
+    if pages > 1:
+        text += f"\n\n📄 Страница {page} из {pages}"
+    return text, page, pages
+
+def get_junior_admins_list(page=1):
+    """Получение списка младших администраторов онлайн"""
+    return get_junior_admins_page(page)[0]
 
 # ==== Список старших админов ====
+@initialized
 def get_senior_admins_list():
     """Получение списка старших администраторов"""
-    if not senior_admins:
+    with state_lock:
+        ids = list(senior_admins)
+    if not ids:
         return "👤 Старшие администраторы:\n\nСписок пуст."
 
+    names = user_cache.get_many(ids)
     result = []
-    for i, sa_id in enumerate(senior_admins, start=1):
-        first_name, last_name = get_user_info(sa_id)
-        status = "✅ В сети" if str(sa_id) in admins else "❌ Не в сети"
+    for i, sa_id in enumerate(ids, start=1):
+        first_name, last_name = names[int(sa_id)]
+        status = "✅ В сети" if roles.has("junior", sa_id) else "❌ Не в сети"
         result.append(f"{i}. [id{sa_id}|{first_name} {last_name}] — {status}")
     
     return "👤 Старшие администраторы:\n\n" + "\n".join(result)
 
 # ==== Список руководства ====
+@initialized
 def get_management_list():
     """Получение списка руководства"""
-    if not management:
+    with state_lock:
+        ids = list(management)
+    if not ids:
         return "👑 Руководство:\n\nСписок пуст."
 
+    names = user_cache.get_many(ids)
     result = []
-    for i, m_id in enumerate(management, start=1):
-        first_name, last_name = get_user_info(m_id)
-        status = "✅ В сети" if str(m_id) in admins else "❌ Не в сети"
+    for i, m_id in enumerate(ids, start=1):
+        first_name, last_name = names[int(m_id)]
+        status = "✅ В сети" if roles.has("junior", m_id) else "❌ Не в сети"
         result.append(f"{i}. [id{m_id}|{first_name} {last_name}] — {status}")
     
     return "👑 Руководство:\n\n" + "\n".join(result)
 
 # ==== Проверка устаревших сессий ====
-def check_expired_sessions():
-    """Проверка и удаление сессий старше 24 часов"""
+# Время жизни сессии (SESSION_TTL_HOURS, по умолчанию 24 часа)
+SESSION_TTL = float(os.getenv("SESSION_TTL_HOURS", "24")) * 3600
+
+@initialized
+def expire_sessions(user_ids):
+    """Удаление истекших сессий одним сохранением"""
     now = time.time()
-    expired = []
-    for uid, info in admins.items():
-        if now - info.get("start_time", 0) > 24 * 3600:
-            expired.append(uid)
-    
-    for uid in expired:
-        del admins[uid]
-    
-    if expired:
-        save_admins()
-        logger.info(f"Удалено {len(expired)} устаревших сессий")
+    with state_lock:
+        expired = []
+        for uid in user_ids:
+            info = admins.get(str(uid))
+            if (info is not None and now - info.start_time >= SESSION_TTL
+                    and storage.release_session(uid)):
+                roles.remove("junior", uid)
+                expired.append(str(uid))
+        
+        if expired:
+            save_admins(*expired)
+            logger.info("Удалено %s устаревших сессий", len(expired))
+
+def check_expired_sessions():
+    """Проверка и удаление сессий старше SESSION_TTL"""
+    expire_sessions(session_expiry.pop_due())
 
-# Стартовая информация
-logger.info("🤖 Бот запущен")
-logger.info(f"👑 Руководство: {len(management)} человек")
-logger.info(f"👤 Старшие администраторы: {len(senior_admins)} человек")
-check_expired_sessions()
+def track_session(role, user_id, added, info):
+    """Сессии младших администраторов отслеживаются планировщиком истечения"""
+    if role != "junior":
+        return
+    if added:
+        session_expiry.add(user_id, info.start_time)
+    else:
+        session_expiry.discard(user_id)
 
-# Хранение состояния ожидания ввода
-waiting_for_input = {}
-message_counter = 0
+session_expiry = ExpiryScheduler(SESSION_TTL, expire_sessions)
 
-# ================= ГЛАВНЫЙ ЦИКЛ =================
-for event in longpoll.listen():
+# История смен (HISTORY_FILE): завершенные сессии и суммы по дням и неделям
+history = ShiftHistory(os.getenv("HISTORY_FILE", "history.jsonl"), max_duration=SESSION_TTL)
+
+def record_shift(role, user_id, added, info):
+    """Смену записывает процесс, который ее завершил, а не синхронизация"""
+    if not getattr(syncing, "active", False):
+        history.on_role_change(role, user_id, added, info)
+
+# ==== Инициализация ====
+_init_lock = threading.Lock()
+# Время загрузки состояния в init(), секунды
+startup_seconds = None
+
+def init():
+    """Загрузка состояния и подписки на изменения ролей (один раз, при первом обращении)"""
+    global storage, admins, senior_admins, management, roles, startup_seconds, waiting_for_input
+    if roles is not None:
+        return
+    with _init_lock:
+        if roles is not None:
+            return
+        started = time.perf_counter()
+        build_keyboards()
+        storage = open_state_storage()
+        # История читается параллельно с файлами состояния
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            history_loaded = pool.submit(history.load)
+            admins, senior_admins, management = storage.load()
+            history_loaded.result()
+        logger.info("Загружено %s младших администраторов", len(admins))
+        logger.info("Загружено %s старших администраторов", len(senior_admins))
+        logger.info("Загружено %s руководства", len(management))
+
+        registry = RoleRegistry(admins, senior_admins, management)
+        # Списки с дублями или строковыми ID сохраняем в исправленном виде
+        for role in registry.normalized:
+            logger.warning("Список роли %s исправлен (повторы или строковые ID)", role)
+            storage.save_role({"senior": "senior_admins", "management": "management"}[role],
+                              registry.lists[role])
+        for uid, info in admins.items():
+            session_expiry.add(int(uid), info.start_time)
+            roster.add(uid, info)
+        registry.add_listener(track_session)
+        registry.add_listener(roster.on_role_change)
+        registry.add_listener(record_shift)
+        digest.peer_ids = parse_peer_ids(os.getenv("DIGEST_PEER_IDS", ""))
+        waiting_for_input = storage.pending_input(ttl=float(os.getenv("DIALOG_TTL", "300")))
+
+        # Сохраняем отложенные изменения при остановке (в т.ч. по SIGTERM)
+        atexit.register(storage.close)
+        atexit.register(history.close)
+        roles = registry
+        startup_seconds = time.perf_counter() - started
+
+    # Стартовая информация
+    logger.info("🤖 Бот запущен")
+    logger.info("👑 Руководство: %s человек", len(management))
+    logger.info("👤 Старшие администраторы: %s человек", len(senior_admins))
+    logger.info("⏱ Импорт: %.0f мс, загрузка состояния: %.0f мс", import_seconds * 1000, startup_seconds * 1000)
+    check_expired_sessions()
+
+# Хранение состояния ожидания ввода (брошенный диалог забывается через DIALOG_TTL).
+# Создается хранилищем в init(): при STORAGE_BACKEND=redis оно общее для процессов
+waiting_for_input = None
+
+# ================= КОМАНДЫ =================
+@initialized
+def has_permission(permission, user_id):
+    """Проверка роли пользователя для команды"""
+    return roles.has(permission, user_id)
+
+router = CommandRouter(has_permission, lambda request, text: reply(request, text))
+
+def reply(request, message, keyboard=None):
+    """Ответ на сообщение с клавиатурой отправителя"""
+    send_message(request.peer_id, message, request.user_id, keyboard, request.client)
+
+# Группы ролей: (в творительном падеже, в родительном множественного),
+# функция сохранения изменений
+ROLE_GROUPS = {
+    "junior": ("младшим администратором", "младших администраторов", lambda *uids: save_admins(*uids)),
+    "senior": ("старшим администратором", "старших администраторов", lambda *uids: save_senior_admins()),
+    "management": ("руководством", "руководства", lambda *uids: save_management()),
+}
+
+@initialized
+def change_role(operation, group, target_id, first_name, last_name, ending=""):
+    """Выдача (add) или снятие (remove) роли; возвращает текст ответа.
+
+    ending дописывается к предупреждениям и сообщению об удалении
+    (в диалоге они заканчиваются точкой).
+    """
+    title, plural, save = ROLE_GROUPS[group]
+    target = f"[id{target_id}|{first_name} {last_name}]"
+    with state_lock:
+        if operation == "add":
+            info = None
+            if group == "junior":
+                info = Session(time.time(), first_name, last_name)
+            if group == "junior" and not storage.claim_session(target_id, info):
+                return f"⚠️ {target} уже является {title}{ending}"
+            if not roles.add(group, target_id, info):
+                return f"⚠️ {target} уже является {title}{ending}"
+            save(target_id)
+            return f"✅ {target} назначен {title}!"
+
+        if group == "junior" and roles.has(group, target_id) and not storage.release_session(target_id):
+            return f"⚠️ {target} не является {title}{ending}"
+        if not roles.remove(group, target_id):
+            return f"⚠️ {target} не является {title}{ending}"
+        save(target_id)
+        return f"✅ {target} удален из {plural}{ending}"
+
+@initialized
+def change_roles(operation, group, target_ids, names):
+    """Выдача или снятие роли нескольким пользователям с одним сохранением.
+
+    names — {user_id: (имя, фамилия)}. Возвращает (измененные ID, пропущенные ID).
+    """
+    _, _, save = ROLE_GROUPS[group]
+    changed = []
+    skipped = []
+    with state_lock:
+        now = time.time()
+        for uid in target_ids:
+            if operation == "add":
+                info = None
+                if group == "junior":
+                    first_name, last_name = names[uid]
+                    info = Session(now, first_name, last_name)
+                done = ((group != "junior" or storage.claim_session(uid, info))
+                        and roles.add(group, uid, info))
+            else:
+                done = (roles.has(group, uid)
+                        and (group != "junior" or storage.release_session(uid))
+                        and roles.remove(group, uid))
+            (changed if done else skipped).append(uid)
+        if changed:
+            save(*changed)
+    return changed, skipped
+
+# Сколько пользователей перечислять в итоговом ответе (лимит длины сообщения VK)
+BULK_REPLY_NAMES = 50
+
+def format_user_links(user_ids, names):
+    """Список ссылок [idN|Имя Фамилия] (не длиннее BULK_REPLY_NAMES)"""
+    links = [f"[id{uid}|{names[uid][0]} {names[uid][1]}]" for uid in user_ids[:BULK_REPLY_NAMES]]
+    if len(user_ids) > BULK_REPLY_NAMES:
+        links.append(f"и еще {len(user_ids) - BULK_REPLY_NAMES}")
+    return ", ".join(links)
+
+def format_bulk_result(operation, group, changed, skipped, unknown, names):
+    """Итоговый ответ на массовую команду"""
+    title, plural, _ = ROLE_GROUPS[group]
+    if operation == "add":
+        lines = [f"✅ Назначены {title}: {len(changed)}"]
+        skipped_title = f"⚠️ Уже являются {title}"
+    else:
+        lines = [f"✅ Удалены из {plural}: {len(changed)}"]
+        skipped_title = f"⚠️ Не являются {title}"
+    if changed:
+        lines[0] += f"\n{format_user_links(changed, names)}"
+    if skipped:
+        lines.append(f"{skipped_title}: {len(skipped)}\n{format_user_links(skipped, names)}")
+    if unknown:
+        shown = ", ".join(unknown[:BULK_REPLY_NAMES])
+        lines.append(f"❌ Не распознаны: {len(unknown)}\n{shown}")
+    return "\n\n".join(lines)
+
+# Массовые команды: не больше BULK_LIMIT пользователей, файл-список до BULK_FILE_SIZE байт
+BULK_LIMIT = int(os.getenv("BULK_LIMIT", "500"))
+BULK_FILE_SIZE = int(os.getenv("BULK_FILE_SIZE", str(256 * 1024)))
+
+def read_attached_list(request):
+    """Текст приложенного .txt/.csv файла со списком пользователей (или None)"""
+    for attachment in request.attachments:
+        doc = attachment.get("doc") if attachment.get("type") == "doc" else None
+        if not doc or doc.get("ext", "").lower() not in ("txt", "csv"):
+            continue
+        if doc.get("size", 0) > BULK_FILE_SIZE:
+            raise ValueError(f"файл больше {BULK_FILE_SIZE // 1024} КБ")
+        response = (request.client or get_client()).vk_session.http.get(doc["url"], timeout=10)
+        response.raise_for_status()
+        return response.content[:BULK_FILE_SIZE].decode("utf-8", errors="replace")
+    return None
+
+@router.command("/addgroup", "/removegroup", permission="management")
+def command_change_group(request, command):
+    """/addgroup и /removegroup [группа] [пользователи...] (или файл со списком)"""
+    if len(request.args) < 2 or (len(request.args) < 3 and not request.attachments):
+        reply(request,
+              f"❌ Использование: {command} [группа] [пользователь]\n"
+              "Группы: junior, senior, management\n"
+              f"Пример: {command} junior @durov\n"
+              "Можно перечислить несколько пользователей или приложить .txt файл со списком")
+        return
+
+    group = request.args[1].lower()
+    operation = "add" if command == "/addgroup" else "remove"
+    targets = request.text.split(None, 2)[2] if len(request.args) > 2 else ""
+    try:
+        attached = read_attached_list(request)
+    except Exception as e:
+        reply(request, f"❌ Не удалось прочитать файл: {e}")
+        return
+
+    if attached is None and len(USER_TOKEN_RE.findall(targets)) <= 1:
+        # Один пользователь — прежний ответ
+        target_id = parse_user_input(targets)
+        if not target_id:
+            reply(request, "❌ Не удалось распознать пользователя")
+            return
+
+        if group not in ROLE_GROUPS:
+            reply(request, "❌ Неизвестная группа. Доступно: junior, senior, management")
+            return
+
+        first_name, last_name = get_user_info(target_id)
+        reply(request, change_role(operation, group, target_id, first_name, last_name))
+        return
+
+    if group not in ROLE_GROUPS:
+        reply(request, "❌ Неизвестная группа. Доступно: junior, senior, management")
+        return
+
+    user_ids, unknown = resolve_user_refs(f"{targets}\n{attached or ''}")
+    if len(user_ids) > BULK_LIMIT:
+        reply(request, f"❌ За один раз можно изменить не больше {BULK_LIMIT} пользователей")
+        return
+    if not user_ids:
+        reply(request, "❌ Не удалось распознать пользователей")
+        return
+
+    names = user_cache.get_many(user_ids)
+    changed, skipped = change_roles(operation, group, user_ids, names)
+    reply(request, format_bulk_result(operation, group, changed, skipped, unknown, names))
+    logger.info("%s %s: изменено %s, пропущено %s, не распознано %s",
+                command, group, len(changed), len(skipped), len(unknown))
+
+@router.command("/help")
+def command_help(request, command):
+    help_text = (
+        "📋 **Доступные команды:**\n\n"
+        "**Для руководства:**\n"
+        "/addgroup [группа] [пользователь] - добавить в группу\n"
+        "/removegroup [группа] [пользователь] - удалить из группы\n"
+        "Можно указать несколько пользователей или приложить .txt файл со списком\n"
+        "Группы: junior, senior, management\n\n"
+        "**Для всех:**\n"
+        "Кнопки в меню для входа/выхода и просмотра списков\n"
+        "/top [day|week] - больше всех онлайн\n"
+        "/mystats - моя статистика\n"
+        "/day [ГГГГ-ММ-ДД] - итоги дня"
+    )
+    reply(request, help_text)
+
+@router.command("/start")
+def command_start(request, command):
+    # Клавиатура прикладывается всегда: так пользователь может вернуть
+    # клавиатуру, которую потерял клиент
+    (request.client or get_client()).peer_keyboards.pop(request.peer_id, None)
+    reply(request, "👋 Добро пожаловать! Используйте кнопки ниже для навигации.")
+
+# Подпись в ответе на вход: по старшей роли пользователя
+ROLE_TITLES = {"management": "Руководство", "senior": "Старший администратор"}
+
+@router.action("entered")
+def action_entered(request, action):
+    user_id = request.user_id
+    if is_junior_admin(user_id):
+        reply(request, "⚠️ Вы уже авторизованы.")
+        return
+
+    first_name, last_name = get_user_info(user_id)
+    info = Session(time.time(), first_name, last_name)
+    with state_lock:
+        # Сессию открывает только один процесс (в общем хранилище — атомарно)
+        added = storage.claim_session(user_id, info) and roles.add("junior", user_id, info)
+        if added:
+            save_admins(user_id)
+        online_count = roles.count("junior")
+    if not added:
+        reply(request, "⚠️ Вы уже авторизованы.")
+        return
+
+    role_text = ROLE_TITLES.get(get_user_role(user_id), "Младший администратор")
+
+    reply(request,
+          f"✅ {role_text} [id{user_id}|{first_name} {last_name}] успешно авторизовался.\n"
+          f"👥 Мл.админов онлайн: {online_count}")
+    logger.info("Пользователь %s (%s %s) авторизовался", user_id, first_name, last_name)
+
+@router.action("exited")
+def action_exited(request, action):
+    user_id = request.user_id
+    with state_lock:
+        info = admins.get(user_id)
+        if info is not None and storage.release_session(user_id):
+            roles.remove("junior", user_id)
+            save_admins(user_id)
+        else:
+            # Сессию уже закрыл другой процесс — локальную запись уберет синхронизация
+            info = None
+        online_count = roles.count("junior")
+    if info is None:
+        reply(request, "⚠️ Вы не авторизованы.")
+        return
+
+    first_name, last_name = info.first_name, info.last_name
+    reply(request,
+          f"❌ Администратор [id{user_id}|{first_name} {last_name}] вышел из системы.\n"
+          f"👥 Мл.админов онлайн: {online_count}")
+    logger.info("Пользователь %s (%s %s) вышел", user_id, first_name, last_name)
+
+LIST_VIEWS = {
+    "junior_admins": lambda: get_junior_admins_list(),
+    "senior_admins": lambda: get_senior_admins_list(),
+    "management": lambda: get_management_list(),
+}
+
+@router.action(*LIST_VIEWS)
+def action_list(request, action):
+    if action == "junior_admins":
+        # Кнопки листания присылают {"command": "junior_admins", "page": N}
+        page = request.payload.get("page", 1) if isinstance(request.payload, dict) else 1
+        text, page, pages = get_junior_admins_page(page if isinstance(page, int) else 1)
+        reply(request, text, get_page_keyboard(action, page, pages))
+        return
+    reply(request, LIST_VIEWS[action]())
+
+# ==== Статистика смен ====
+@router.command("/top")
+def command_top(request, command):
+    """/top [day|week] — лидеры по времени онлайн"""
+    period = "day" if len(request.args) > 1 and request.args[1].lower() == "day" else "week"
+    title = "🏆 Больше всех онлайн за сегодня:" if period == "day" else "🏆 Больше всех онлайн за неделю:"
+    leaders = history.top(period)
+    if not leaders:
+        reply(request, f"{title}\n\nЗавершенных смен пока нет.")
+        return
+
+    names = user_cache.get_many([uid for uid, _ in leaders])
+    result = []
+    for i, (uid, seconds) in enumerate(leaders, start=1):
+        first_name, last_name = names[uid]
+        result.append(f"{i}. [id{uid}|{first_name} {last_name}] — ⏱ {format_time(seconds)}")
+    reply(request, f"{title}\n\n" + "\n".join(result))
+
+@router.command("/mystats")
+def command_mystats(request, command):
+    """/mystats — время онлайн отправителя"""
+    today, week, total, shifts = history.user_stats(request.user_id)
+    text = (
+        "📊 Ваша статистика:\n\n"
+        f"Сегодня: {format_time(today)}\n"
+        f"За неделю: {format_time(week)}\n"
+        f"Всего: {format_time(total)} ({shifts} смен)"
+    )
+    with state_lock:
+        info = admins.get(request.user_id)
+    if info is not None:
+        text += f"\nТекущая смена: {format_time(time.time() - info.start_time)}"
+    reply(request, text)
+
+@router.command("/day")
+def command_day(request, command):
+    """/day [ГГГГ-ММ-ДД] — итоги дня (по умолчанию сегодня)"""
+    day = request.args[1] if len(request.args) > 1 else time.strftime("%Y-%m-%d")
+    try:
+        # Ключи итогов — с ведущими нулями: 2026-1-5 приводится к 2026-01-05
+        day = time.strftime("%Y-%m-%d", time.strptime(day, "%Y-%m-%d"))
+    except ValueError:
+        reply(request, f"❌ Использование: {command} [ГГГГ-ММ-ДД]")
+        return
+
+    seconds, shifts, people = history.day_totals(day)
+    reply(request,
+          f"📅 Итоги {day}:\n\n"
+          f"Время онлайн: {format_time(seconds)}\n"
+          f"Смен: {shifts}\n"
+          f"Администраторов: {people}")
+
+# ==== Сводка в беседы ====
+# Период рассылки, с; беседы (DIGEST_PEER_IDS через запятую) читаются в init()
+DIGEST_INTERVAL = float(os.getenv("DIGEST_INTERVAL", "600"))
+
+def parse_peer_ids(value):
+    """ID бесед из строки через запятую; некорректные значения пропускаются"""
+    peer_ids = []
+    for item in value.replace(" ", "").split(","):
+        if not item:
+            continue
+        try:
+            peer_ids.append(int(item))
+        except ValueError:
+            logger.warning("DIGEST_PEER_IDS: пропущено некорректное значение %r", item)
+    return peer_ids
+
+@initialized
+def render_digest():
+    """Текст сводки: кто в сети (со временем входа) и итоги дня.
+
+    Длительности не выводятся, поэтому без входов и выходов текст не меняется
+    и повторная рассылка пропускается."""
+    lines, total = roster.render_since(roster.page_size)
+    if lines:
+        text = f"👥 Младшие администраторы в сети ({total}):\n\n" + "\n".join(lines)
+        if total > len(lines):
+            text += f"\n… и еще {total - len(lines)}"
+    else:
+        text = "👥 Младшие администраторы в сети:\n\nСейчас никто не авторизован."
+    day = time.strftime("%Y-%m-%d")
+    seconds, shifts, people = history.day_totals(day)
+    text += f"\n\n📅 Итоги {day}: {format_time(seconds)}, смен: {shifts}, администраторов: {people}"
+    return text
+
+def send_digest(peer_ids, text):
+    """Одно сообщение сразу в несколько бесед (peer_ids)"""
+    get_client().outbox.send("messages.send", {
+        "peer_ids": ",".join(map(str, peer_ids)),
+        "message": text,
+        "random_id": get_random_id()
+    })
+
+digest = DigestScheduler(render_digest, send_digest, (), DIGEST_INTERVAL)
+
+# Действия только для руководства: запрос пользователя, затем change_role
+ROLE_PROMPTS = {
+    "add_junior": "👥 Отправьте ID или ссылку на пользователя, которого хотите назначить младшим администратором:",
+    "remove_junior": "👥 Отправьте ID или ссылку на пользователя, которого хотите удалить из младших администраторов:",
+    "add_senior": "👤 Отправьте ID или ссылку на пользователя, которого хотите назначить старшим администратором:",
+    "remove_senior": "👤 Отправьте ID или ссылку на пользователя, которого хотите удалить из старших администраторов:",
+    "add_management": "👑 Отправьте ID или ссылку на пользователя, которого хотите назначить руководством:",
+    "remove_management": "👑 Отправьте ID или ссылку на пользователя, которого хотите удалить из руководства:"
+}
+
+@router.action(*ROLE_PROMPTS, permission="management", denied="⛔ Эта команда доступна только руководству.")
+def action_role_prompt(request, action):
+    reply(request, ROLE_PROMPTS[action])
+    waiting_for_input.set(request.user_id, action)
+
+def handle_role_input(request, action):
+    """Ответ на запрос ROLE_PROMPTS: ID или ссылка на пользователя"""
+    target_id = parse_user_input(request.text)
+    if not target_id:
+        reply(request, "❌ Не удалось распознать пользователя. Отправьте ID или ссылку.")
+        return
+
+    first_name, last_name = get_user_info(target_id)
+    operation, group = action.split("_", 1)
+    reply(request, change_role(operation, group, target_id, first_name, last_name, ending="."))
+
+# ================= ОБРАБОТКА СОБЫТИЙ =================
+def parse_payload(msg):
+    """Payload кнопки из сообщения (или None)"""
+    return payload_decoder.decode(msg.get("payload"))
+
+def handle_message(msg, client=None):
+    """Обработка нового сообщения (client — группа, получившая его)"""
+    client = client or get_client()
+    peer_id = msg["peer_id"]
+    user_id = str(msg["from_id"])
+    message_text = msg.get("text", "")
+
+    # Обработка текстовых команд
+    if message_text.startswith('/'):
+        args = message_text.split()
+        router.dispatch_command(args[0].lower(), Request(peer_id, user_id, message_text, args,
+                                                         attachments=msg.get("attachments"), client=client))
+        return
+
+    payload = parse_payload(msg)
+    request = Request(peer_id, user_id, message_text, payload=payload, client=client)
+
+    # Проверяем, ожидаем ли мы ввод (события одного пользователя
+    # обрабатываются по порядку, поэтому его запись не меняется параллельно)
+    pending_action = waiting_for_input.pop(user_id)
+    if pending_action is not None:
+        handle_role_input(request, pending_action)
+        return
+
+    action = payload.get("command") if isinstance(payload, dict) else None
+    router.dispatch_action(action, request)
+
+@initialized
+def handle_event(event, client=None):
+    """Обработка одного события long poll (вызывается из пула потоков).
+    client — GroupClient группы, получившей событие (по умолчанию GROUP_ID)"""
+    msg = None
+    token = current_event.set(event.raw.get("event_id"))
     try:
         if event.type == VkBotEventType.MESSAGE_NEW:
             msg = event.message
-            peer_id = msg["peer_id"]
-            user_id = str(msg["from_id"])
-            message_text = msg.get("text", "")
-
-            # Периодическая проверка устаревших сессий
-            message_counter += 1
-            if message_counter % 100 == 0:
-                check_expired_sessions()
-
-            # Обработка текстовых команд
-            if message_text.startswith('/'):
-                args = message_text.split()
-                command = args[0].lower()
-                
-                # Команда /addgroup
-                if command == '/addgroup' and is_management(user_id):
-                    if len(args) < 3:
-                        send_message(peer_id, 
-                            "❌ Использование: /addgroup [группа] [пользователь]\n"
-                            "Группы: junior, senior, management\n"
-                            "Пример: /addgroup junior @durov", user_id)
-                    else:
-                        group = args[1].lower()
-                        target_input = ' '.join(args[2:])
-                        target_id = parse_user_input(target_input)
-                        
-                        if not target_id:
-                            send_message(peer_id, "❌ Не удалось распознать пользователя", user_id)
-                            continue
-                        
-                        first_name, last_name = get_user_info(target_id)
-                        target_name = f"{first_name} {last_name}"
-                        
-                        if group == 'junior':
-                            if target_id in admins:
-                                send_message(peer_id, f"⚠️ [id{target_id}|{target_name}] уже является младшим администратором", user_id)
-                            else:
-                                admins[target_id] = {
-                                    "start_time": time.time(),
-                                    "first_name": first_name,
-                                    "last_name": last_name
-                                }
-                                save_admins()
-                                send_message(peer_id, f"✅ [id{target_id}|{target_name}] назначен младшим администратором!", user_id)
-                        
-                        elif group == 'senior':
-                            if int(target_id) in senior_admins:
-                                send_message(peer_id, f"⚠️ [id{target_id}|{target_name}] уже является старшим администратором", user_id)
-                            else:
-                                senior_admins.append(int(target_id))
-                                save_senior_admins()
-                                send_message(peer_id, f"✅ [id{target_id}|{target_name}] назначен старшим администратором!", user_id)
-                        
-                        elif group == 'management':
-                            if int(target_id) in management:
-                                send_message(peer_id, f"⚠️ [id{target_id}|{target_name}] уже является руководством", user_id)
-                            else:
-                                management.append(int(target_id))
-                                save_management()
-                                send_message(peer_id, f"✅ [id{target_id}|{target_name}] назначен руководством!", user_id)
-                        
-                        else:
-                            send_message(peer_id, "❌ Неизвестная группа. Доступно: junior, senior, management", user_id)
-                
-                # Команда /removegroup
-                elif command == '/removegroup' and is_management(user_id):
-                    if len(args) < 3:
-                        send_message(peer_id, 
-                            "❌ Использование: /removegroup [группа] [пользователь]\n"
-                            "Группы: junior, senior, management\n"
-                            "Пример: /removegroup junior @durov", user_id)
-                    else:
-                        group = args[1].lower()
-                        target_input = ' '.join(args[2:])
-                        target_id = parse_user_input(target_input)
-                        
-                        if not target_id:
-                            send_message(peer_id, "❌ Не удалось распознать пользователя", user_id)
-                            continue
-                        
-                        first_name, last_name = get_user_info(target_id)
-                        target_name = f"{first_name} {last_name}"
-                        
-                        if group == 'junior':
-                            if target_id not in admins:
-                                send_message(peer_id, f"⚠️ [id{target_id}|{target_name}] не является младшим администратором", user_id)
-                            else:
-                                del admins[target_id]
-                                save_admins()
-                                send_message(peer_id, f"✅ [id{target_id}|{target_name}] удален из младших администраторов", user_id)
-                        
-                        elif group == 'senior':
-                            if int(target_id) not in senior_admins:
-                                send_message(peer_id, f"⚠️ [id{target_id}|{target_name}] не является старшим администратором", user_id)
-                            else:
-                                senior_admins.remove(int(target_id))
-                                save_senior_admins()
-                                send_message(peer_id, f"✅ [id{target_id}|{target_name}] удален из старших администраторов", user_id)
-                        
-                        elif group == 'management':
-                            if int(target_id) not in management:
-                                send_message(peer_id, f"⚠️ [id{target_id}|{target_name}] не является руководством", user_id)
-                            else:
-                                management.remove(int(target_id))
-                                save_management()
-                                send_message(peer_id, f"✅ [id{target_id}|{target_name}] удален из руководства", user_id)
-                        
-                        else:
-                            send_message(peer_id, "❌ Неизвестная группа. Доступно: junior, senior, management", user_id)
-                
-                # Команда /help
-                elif command == '/help':
-                    help_text = (
-                        "📋 **Доступные команды:**\n\n"
-                        "**Для руководства:**\n"
-                        "/addgroup [группа] [пользователь] - добавить в группу\n"
-                        "/removegroup [группа] [пользователь] - удалить из группы\n"
-                        "Группы: junior, senior, management\n\n"
-                        "**Для всех:**\n"
-                        "Кнопки в меню для входа/выхода и просмотра списков"
-                    )
-                    send_message(peer_id, help_text, user_id)
-                
-                # Команда /start
-                elif command == '/start':
-                    send_message(peer_id, "👋 Добро пожаловать! Используйте кнопки ниже для навигации.", user_id)
-                
-                continue
-
-            # Парсинг payload из сообщения
-            payload = None
-            if msg.get("payload"):
-                try:
-                    if isinstance(msg["payload"], str):
-                        payload = json.loads(msg["payload"])
-                    elif isinstance(msg["payload"], dict):
-                        payload = msg["payload"]
-                    else:
-                        payload = ast.literal_eval(msg["payload"])
-                except Exception as e:
-                    logger.error(f"Ошибка парсинга payload: {e}")
-
-            action = payload.get("command") if payload else None
-
-            # Проверяем, ожидаем ли мы ввод
-            if user_id in waiting_for_input:
-                action_input = waiting_for_input[user_id]
-                
-                if action_input in ["add_junior", "remove_junior", "add_senior", "remove_senior", "add_management", "remove_management"]:
-                    target_id = parse_user_input(message_text)
-                    
-                    if not target_id:
-                        send_message(peer_id, "❌ Не удалось распознать пользователя. Отправьте ID или ссылку.", user_id)
-                        del waiting_for_input[user_id]
-                        continue
-                    
-                    first_name, last_name = get_user_info(target_id)
-                    target_name = f"{first_name} {last_name}"
-                    
-                    if action_input == "add_junior":
-                        if target_id in admins:
-                            send_message(peer_id, f"⚠️ [id{target_id}|{target_name}] уже является младшим администратором.", user_id)
-                        else:
-                            admins[target_id] = {
-                                "start_time": time.time(),
-                                "first_name": first_name,
-                                "last_name": last_name
-                            }
-                            save_admins()
-                            send_message(peer_id, f"✅ [id{target_id}|{target_name}] назначен младшим администратором!", user_id)
-                    
-                    elif action_input == "remove_junior":
-                        if target_id not in admins:
-                            send_message(peer_id, f"⚠️ [id{target_id}|{target_name}] не является младшим администратором.", user_id)
-                        else:
-                            del admins[target_id]
-                            save_admins()
-                            send_message(peer_id, f"✅ [id{target_id}|{target_name}] удален из младших администраторов.", user_id)
-                    
-                    elif action_input == "add_senior":
-                        if int(target_id) in senior_admins:
-                            send_message(peer_id, f"⚠️ [id{target_id}|{target_name}] уже является старшим администратором.", user_id)
-                        else:
-                            senior_admins.append(int(target_id))
-                            save_senior_admins()
-                            send_message(peer_id, f"✅ [id{target_id}|{target_name}] назначен старшим администратором!", user_id)
-                    
-                    elif action_input == "remove_senior":
-                        if int(target_id) not in senior_admins:
-                            send_message(peer_id, f"⚠️ [id{target_id}|{target_name}] не является старшим администратором.", user_id)
-                        else:
-                            senior_admins.remove(int(target_id))
-                            save_senior_admins()
-                            send_message(peer_id, f"✅ [id{target_id}|{target_name}] удален из старших администраторов.", user_id)
-                    
-                    elif action_input == "add_management":
-                        if int(target_id) in management:
-                            send_message(peer_id, f"⚠️ [id{target_id}|{target_name}] уже является руководством.", user_id)
-                        else:
-                            management.append(int(target_id))
-                            save_management()
-                            send_message(peer_id, f"✅ [id{target_id}|{target_name}] назначен руководством!", user_id)
-                    
-                    elif action_input == "remove_management":
-                        if int(target_id) not in management:
-                            send_message(peer_id, f"⚠️ [id{target_id}|{target_name}] не является руководством.", user_id)
-                        else:
-                            management.remove(int(target_id))
-                            save_management()
-                            send_message(peer_id, f"✅ [id{target_id}|{target_name}] удален из руководства.", user_id)
-                    
-                    del waiting_for_input[user_id]
-                    continue
-
-            # Обработка действий
-            if action == "entered":
-                if user_id in admins:
-                    send_message(peer_id, "⚠️ Вы уже авторизованы.", user_id)
-                else:
-                    first_name, last_name = get_user_info(user_id)
-                    admins[user_id] = {
-                        "start_time": time.time(),
-                        "first_name": first_name,
-                        "last_name": last_name
-                    }
-                    save_admins()
-                    
-                    role_text = "Младший администратор"
-                    if is_senior_admin(user_id):
-                        role_text = "Старший администратор"
-                    if is_management(user_id):
-                        role_text = "Руководство"
-                    
-                    send_message(peer_id,
-                        f"✅ {role_text} [id{user_id}|{first_name} {last_name}] успешно авторизовался.\n"
-                        f"👥 Мл.админов онлайн: {len(admins)}", user_id
-                    )
-                    logger.info(f"Пользователь {user_id} ({first_name} {last_name}) авторизовался")
-
-            elif action == "exited":
-                if user_id not in admins:
-                    send_message(peer_id, "⚠️ Вы не авторизованы.", user_id)
-                else:
-                    first_name = admins[user_id].get("first_name", "Неизвестно")
-                    last_name = admins[user_id].get("last_name", "Неизвестно")
-                    del admins[user_id]
-                    save_admins()
-                    
-                    send_message(peer_id,
-                        f"❌ Администратор [id{user_id}|{first_name} {last_name}] вышел из системы.\n"
-                        f"👥 Мл.админов онлайн: {len(admins)}", user_id
-                    )
-                    logger.info(f"Пользователь {user_id} ({first_name} {last_name}) вышел")
-
-            elif action == "junior_admins":
-                send_message(peer_id, get_junior_admins_list(), user_id)
-
-            elif action == "senior_admins":
-                send_message(peer_id, get_senior_admins_list(), user_id)
-
-            elif action == "management":
-                send_message(peer_id, get_management_list(), user_id)
-
-            # Действия только для руководства
-            elif action in ["add_junior", "remove_junior", "add_senior", "remove_senior", "add_management", "remove_management"]:
-                if not is_management(user_id):
-                    send_message(peer_id, "⛔ Эта команда доступна только руководству.", user_id)
-                    continue
-
-                action_messages = {
-                    "add_junior": "👥 Отправьте ID или ссылку на пользователя, которого хотите назначить младшим администратором:",
-                    "remove_junior": "👥 Отправьте ID или ссылку на пользователя, которого хотите удалить из младших администраторов:",
-                    "add_senior": "👤 Отправьте ID или ссылку на пользователя, которого хотите назначить старшим администратором:",
-                    "remove_senior": "👤 Отправьте ID или ссылку на пользователя, которого хотите удалить из старших администраторов:",
-                    "add_management": "👑 Отправьте ID или ссылку на пользователя, которого хотите назначить руководством:",
-                    "remove_management": "👑 Отправьте ID или ссылку на пользователя, которого хотите удалить из руководства:"
-                }
-                
-                send_message(peer_id, action_messages[action], user_id)
-                waiting_for_input[user_id] = action
-
+            with metrics.timer("bot_event_seconds"):
+                handle_message(msg, client)
     except Exception as e:
-        logger.error(f"Ошибка в обработке события: {e}", exc_info=True)
+        metrics.inc("bot_event_errors_total")
+        logger.error("Ошибка в обработке события: %s", e, exc_info=True)
         try:
-            if 'peer_id' in locals():
-                send_message(peer_id, "❌ Произошла внутренняя ошибка. Попробуйте позже.", 
-                           user_id if 'user_id' in locals() else None)
+            if msg is not None and "peer_id" in msg:
+                send_message(msg["peer_id"], "❌ Произошла внутренняя ошибка. Попробуйте позже.",
+                             str(msg["from_id"]) if "from_id" in msg else None, client=client)
         except:
             pass
+    finally:
+        current_event.reset(token)
+
+def event_key(event):
+    """Ключ очереди события: события одного отправителя обрабатываются по порядку"""
+    message = getattr(event, "message", None)
+    return message.get("from_id", 0) if message else 0
+
+# ================= МЕТРИКИ =================
+@initialized
+def start_metrics(dispatcher=None, outboxes=None):
+    """Включение метрик и HTTP-эндпоинта, если задан METRICS_PORT.
+
+    outboxes — очереди исходящих (в async_bot.py своя у каждой группы),
+    в метриках суммируются."""
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return
+    metrics.register("bot_startup_seconds", lambda: import_seconds + (startup_seconds or 0))
+    metrics.register("bot_online_admins", lambda: roles.count("junior"))
+    metrics.register("bot_senior_admins", lambda: len(senior_admins))
+    metrics.register("bot_management", lambda: len(management))
+    metrics.register("bot_user_cache_hits_total", lambda: user_cache.hits, "counter")
+    metrics.register("bot_user_cache_misses_total", lambda: user_cache.misses, "counter")
+    outboxes = list(outboxes) if outboxes else [get_client().outbox]
+    metrics.register("bot_outbox_queued", lambda: sum(o.stats()["queued"] for o in outboxes))
+    metrics.register("bot_outbox_delivered_total", lambda: sum(o.delivered for o in outboxes), "counter")
+    metrics.register("bot_outbox_retried_total", lambda: sum(o.retried for o in outboxes), "counter")
+    metrics.register("bot_outbox_dropped_total", lambda: sum(o.dropped for o in outboxes), "counter")
+    if log_handler is not None:
+        metrics.register("bot_log_dropped_total", lambda: log_handler.dropped, "counter")
+    if dispatcher is not None:
+        metrics.register("bot_event_queue_depth", lambda: dispatcher.queue_depth)
+        metrics.register("bot_events_in_flight", lambda: dispatcher.in_flight)
+    metrics.serve(int(port), os.getenv("METRICS_HOST", "127.0.0.1"))
+
+# ================= ГЛАВНЫЙ ЦИКЛ =================
+def main():
+    """Синхронный long poll: события передаются в пул из EVENT_WORKERS потоков,
+    очередь ограничена EVENT_QUEUE_SIZE событиями"""
+    setup_logging()
+    check_config()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    init()
+
+    leader = join_cluster()
+
+    # Long poll с переподключением: позиция и обработанные event_id
+    # сохраняются в LONGPOLL_STATE, после перезапуска чтение продолжается с нее
+    consumer = LongPollConsumer(
+        lambda: VkBotLongPoll(get_client().vk_session, GROUP_ID),
+        state_path=os.getenv("LONGPOLL_STATE", "longpoll_state.json"),
+        dedup_size=int(os.getenv("LONGPOLL_DEDUP_SIZE", "10000"))
+    )
+
+    # Запись входящих событий для replay.py (RECORD_EVENTS — файл .jsonl.gz)
+    recorder = None
+    if os.getenv("RECORD_EVENTS"):
+        salt = os.getenv("RECORD_SALT")
+        recorder = EventRecorder(os.getenv("RECORD_EVENTS"), list(management),
+                                 salt.encode("utf-8") if salt else None)
+        atexit.register(recorder.close)
+
+    def process_event(event):
+        try:
+            handle_event(event)
+        finally:
+            consumer.done(event)
+
+    session_expiry.start()
+    # Сводку рассылает только ведущий процесс
+    digest.start()
+    atexit.register(digest.stop)
+    dispatcher = Dispatcher(
+        process_event,
+        workers=int(os.getenv("EVENT_WORKERS", "8")),
+        max_pending=int(os.getenv("EVENT_QUEUE_SIZE", "1000"))
+    )
+    # atexit вызывает в обратном порядке: сначала дообработка очереди, затем контрольная точка
+    atexit.register(consumer.close)
+    atexit.register(dispatcher.shutdown)
+    start_metrics(dispatcher)
+
+    for event in consumer.listen():
+        if leader is not None and leader.lost.is_set():
+            # Ведущим стал другой процесс — выходим, чтобы не обработать события дважды
+            logger.error("Роль ведущего потеряна, остановка")
+            sys.exit(1)
+        if recorder is not None:
+            recorder.record(event)
+        dispatcher.submit(event_key(event), event)
+
+# Время импорта модуля (без загрузки состояния)
+import_seconds = time.perf_counter() - _import_started
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import hashlib
+import logging
+import threading
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Ограничение VK: не больше 100 получателей в одном messages.send
+MAX_PEER_IDS = 100
+
+
+class DigestScheduler:
+    """Периодическая рассылка сводки в беседы.
+
+    Раз в interval секунд render() строит текст один раз для всех бесед,
+    send(peer_ids, text) отправляет его пачками до MAX_PEER_IDS получателей.
+    Если текст совпадает с предыдущим отправленным (по хэшу), рассылка
+    пропускается.
+    """
+
+    def __init__(self, render, send, peer_ids, interval=600.0):
+        self.render = render
+        self.send = send
+        self.peer_ids = list(peer_ids)
+        self.interval = interval
+        self._last_hash = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def tick(self):
+        """Одна рассылка; False, если текст не изменился"""
+        text = self.render()
+        digest_hash = hashlib.sha1(text.encode("utf-8")).digest()
+        if digest_hash == self._last_hash:
+            metrics.inc("bot_digest_skipped_total")
+            return False
+        for i in range(0, len(self.peer_ids), MAX_PEER_IDS):
+            self.send(self.peer_ids[i:i + MAX_PEER_IDS], text)
+        self._last_hash = digest_hash
+        metrics.inc("bot_digest_sent_total")
+        logger.debug("Сводка отправлена в %s бесед", len(self.peer_ids))
+        return True
+
+    # ==== Фоновый таймер ====
+    def start(self):
+        """Запуск фонового потока (без бесед не запускается)"""
+        if not self.peer_ids:
+            return
+        self._thread = threading.Thread(target=self._run, name="digest", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Остановка фонового потока"""
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error("Ошибка рассылки сводки: %s", e, exc_info=True)
@@ -0,0 +1,86 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Dispatcher:
+    """Обработка событий в пуле потоков с сохранением порядка по ключу.
+
+    События с одним ключом (from_id) выполняются строго по очереди, события
+    разных ключей — параллельно. Очередь ограничена max_pending событиями:
+    при переполнении submit() ждет освобождения места.
+    """
+
+    def __init__(self, handler, workers=8, max_pending=1000):
+        self.handler = handler
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="event")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._queues = {}  # ключ -> очередь событий (ключ есть, пока цепочка активна)
+        self._pending = 0
+        self._in_flight = 0
+
+    @property
+    def queue_depth(self):
+        """Количество событий, ожидающих обработки"""
+        return self._pending
+
+    @property
+    def in_flight(self):
+        """Количество событий, обрабатываемых прямо сейчас"""
+        return self._in_flight
+
+    def submit(self, key, item, block=True):
+        """Поставить событие в очередь ключа; block=False — не ждать места
+        в заполненной очереди (тогда возвращает False)"""
+        if not self._slots.acquire(blocking=False):
+            if not block:
+                return False
+            logger.debug("Очередь событий заполнена (%s), ожидание", self._pending)
+            self._slots.acquire()
+
+        with self._lock:
+            self._pending += 1
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.append(item)
+                return True
+            self._queues[key] = deque([item])
+        self._executor.submit(self._run, key)
+        return True
+
+    def _run(self, key):
+        """Обработка событий ключа по одному; продолжение ставится в конец пула"""
+        while True:
+            with self._lock:
+                item = self._queues[key].popleft()
+                self._pending -= 1
+                self._in_flight += 1
+
+            try:
+                self.handler(item)
+            except Exception as e:
+                logger.error("Ошибка в обработчике события: %s", e, exc_info=True)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    has_more = bool(self._queues[key])
+                    if not has_more:
+                        del self._queues[key]
+                self._slots.release()
+
+            if not has_more:
+                return
+            try:
+                self._executor.submit(self._run, key)
+                return
+            except RuntimeError:
+                # Пул останавливается — дорабатываем очередь ключа в этом потоке
+                continue
+
+    def shutdown(self, wait=True):
+        """Остановка пула (с ожиданием обработки поставленных событий)"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,93 @@
+import time
+import heapq
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiryScheduler:
+    """Истечение сессий по таймеру: min-heap по start_time.
+
+    Фоновый поток спит до ближайшего срока и передает в on_expired список
+    истекших user_id одним вызовом. Записи, замененные или удаленные раньше
+    срока, удаляются из кучи лениво (по несовпадению start_time).
+    """
+
+    def __init__(self, ttl, on_expired):
+        self.ttl = ttl
+        self.on_expired = on_expired
+        self._heap = []    # (start_time, user_id)
+        self._starts = {}  # user_id -> start_time актуальной сессии
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def __len__(self):
+        return len(self._starts)
+
+    def add(self, user_id, start_time):
+        """Отслеживание новой сессии"""
+        with self._lock:
+            self._starts[user_id] = start_time
+            heapq.heappush(self._heap, (start_time, user_id))
+            earliest = self._heap[0][1] == user_id
+            # Ленивое удаление копит устаревшие записи — иногда перестраиваем кучу
+            if len(self._heap) > 2 * len(self._starts) + 64:
+                self._heap = [(start, uid) for uid, start in self._starts.items()]
+                heapq.heapify(self._heap)
+        if earliest:
+            self._wakeup.set()
+
+    def discard(self, user_id):
+        """Сессия завершена раньше срока"""
+        with self._lock:
+            self._starts.pop(user_id, None)
+
+    def next_due(self):
+        """Время ближайшего истечения (или None)"""
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] + self.ttl if self._heap else None
+
+    def pop_due(self, now=None):
+        """Извлечение всех истекших к now сессий за O(k log n)"""
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] + self.ttl <= now:
+                start_time, user_id = heapq.heappop(self._heap)
+                if self._starts.get(user_id) == start_time:
+                    del self._starts[user_id]
+                    due.append(user_id)
+        return due
+
+    def _drop_stale(self):
+        while self._heap and self._starts.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    # ==== Фоновый таймер ====
+    def start(self):
+        """Запуск фонового потока"""
+        self._thread = threading.Thread(target=self._run, name="expiry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Остановка фонового потока"""
+        self._stopped = True
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped:
+            due = self.pop_due()
+            if due:
+                try:
+                    self.on_expired(due)
+                except Exception as e:
+                    logger.error("Ошибка при удалении устаревших сессий: %s", e, exc_info=True)
+
+            next_due = self.next_due()
+            timeout = None if next_due is None else max(0.0, next_due - time.time())
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
@@ -0,0 +1,145 @@
+import re
+import json
+import time
+import random
+import threading
+from collections import Counter
+
+import vk_api
+from vk_api.bot_longpoll import VkBotMessageEvent
+from vk_api.exceptions import ApiError
+
+# Разбор кода execute, который формирует VkRequestsPool для вызовов одного метода
+EXECUTE_VALUES_RE = re.compile(r"var values = (.*?),\s*i = 0", re.S)
+EXECUTE_METHOD_RE = re.compile(r"API\.([\w.]+)\(values\[i\]\)")
+
+
+class FakeVkApi(vk_api.VkApi):
+    """Локальная замена VkApi для нагрузочных тестов.
+
+    Отвечает на users.get, messages.send, utils.resolveScreenName и execute
+    (пачки одного метода из VkRequestsPool), добавляет задержку latency
+    секунд и с вероятностью error_rate возвращает внутреннюю ошибку VK (10).
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        super().__init__(token="fake")
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.calls = Counter()     # HTTP-запросы по методам
+        self.sent_messages = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def method(self, method, values=None, raw=False, **kwargs):
+        values = values or {}
+        with self._lock:
+            self.calls[method] += 1
+            failed = self.error_rate and self.random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            raise ApiError(self, method, values, raw, {"error_code": 10, "error_msg": "Internal server error"})
+
+        if method == "execute":
+            response = {"response": self._execute(values["code"])}
+            return response if raw else response["response"]
+        response = self._call(method, values)
+        return {"response": response} if raw else response
+
+    def _execute(self, code):
+        values = EXECUTE_VALUES_RE.search(code)
+        method = EXECUTE_METHOD_RE.search(code)
+        if not values or not method:
+            raise NotImplementedError("FakeVkApi поддерживает execute только для одного метода")
+        return [self._call(method.group(1), params) for params in json.loads(values.group(1))]
+
+    def _call(self, method, values):
+        if method == "users.get":
+            users = []
+            for user_id in str(values.get("user_ids", "")).split(","):
+                uid = int(user_id) if user_id.isdigit() else 1_000_000 + len(user_id)
+                screen_name = f"id{uid}" if user_id.isdigit() else user_id
+                users.append({"id": uid, "first_name": f"Имя{uid}", "last_name": f"Фамилия{uid}",
+                              "screen_name": screen_name})
+            return users
+        if method == "messages.send":
+            with self._lock:
+                self.sent_messages += 1
+                return self.sent_messages
+        if method == "utils.resolveScreenName":
+            return {"type": "user", "object_id": 1_000_000 + len(values.get("screen_name", ""))}
+        if method == "groups.getLongPollServer":
+            return {"key": "fake", "server": "https://lp.vk.invalid", "ts": "1"}
+        return 1
+
+
+def make_message_event(from_id, text="", command=None, peer_id=None, group_id=1, event_id=None):
+    """Событие message_new в формате Bots Long Poll"""
+    message = {
+        "from_id": from_id,
+        "peer_id": peer_id or from_id,
+        "text": text,
+        "date": int(time.time()),
+    }
+    if command:
+        message["payload"] = json.dumps({"command": command})
+    raw = {"type": "message_new", "object": {"message": message, "client_info": {}}, "group_id": group_id}
+    if event_id is not None:
+        raw["event_id"] = event_id
+    return VkBotMessageEvent(raw)
+
+
+# Доли типов событий в синтетической нагрузке
+DEFAULT_MIX = {
+    "checkin": 0.35,
+    "checkout": 0.25,
+    "list": 0.3,
+    "admin": 0.1,
+}
+
+LIST_COMMANDS = ("junior_admins", "senior_admins", "management")
+
+
+def synthetic_events(count, roster_size=200, management_ids=(1,), mix=None, seed=None):
+    """Поток синтетических событий: входы/выходы, просмотр списков, команды руководства"""
+    rnd = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    for i in range(count):
+        kind = rnd.choices(kinds, weights)[0]
+        user_id = rnd.randint(1, roster_size)
+        if kind == "checkin":
+            yield make_message_event(user_id, "✅ Вошел", "entered", event_id=str(i))
+        elif kind == "checkout":
+            yield make_message_event(user_id, "❌ Вышел", "exited", event_id=str(i))
+        elif kind == "list":
+            yield make_message_event(user_id, "", rnd.choice(LIST_COMMANDS), event_id=str(i))
+        else:
+            operation = rnd.choice(("/addgroup", "/removegroup"))
+            target = rnd.randint(1, roster_size)
+            yield make_message_event(rnd.choice(management_ids), f"{operation} senior {target}", event_id=str(i))
+
+
+class FakeLongPoll:
+    """Замена VkBotLongPoll: отдает события из итератора с частотой rate в секунду"""
+
+    def __init__(self, events, rate=0):
+        self.events = events
+        self.rate = rate
+
+    def listen(self):
+        interval = 1 / self.rate if self.rate else 0
+        next_time = time.perf_counter()
+        for event in self.events:
+            if interval:
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_time += interval
+            yield event
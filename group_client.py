@@ -0,0 +1,32 @@
+import os
+
+import vk_api
+
+from outbox import Outbox
+
+
+class GroupClient:
+    """Подключение к VK одной группы.
+
+    Сессия и API токена группы (VkApiGroup — лимит 20 запросов в секунду),
+    очередь исходящих и последняя отправленная раскладка клавиатуры по
+    беседам: клавиатура в VK сохраняется, поэтому повторно прикладывается
+    только при смене раскладки. http — сессия requests для VkApiGroup;
+    vk_session — готовая сессия (в async_bot.py — AsyncVkSession на общем
+    пуле соединений).
+    """
+
+    def __init__(self, group_id, token=None, http=None, vk_session=None):
+        self.group_id = group_id
+        if vk_session is None:
+            vk_session = getattr(vk_api, "VkApiGroup", vk_api.VkApi)(token=token, session=http)
+        self.vk_session = vk_session
+        self.vk = vk_session.get_api()
+        # Пачки до 25 вызовов через execute, не больше OUTBOX_RATE запросов
+        # в секунду, повторы при flood control и 5xx
+        self.outbox = Outbox(
+            vk_session,
+            rate=float(os.getenv("OUTBOX_RATE", "20")),
+            max_retries=int(os.getenv("OUTBOX_MAX_RETRIES", "3"))
+        )
+        self.peer_keyboards = {}
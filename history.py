@@ -0,0 +1,198 @@
+"""История смен младших администраторов.
+
+Каждая завершенная сессия дописывается строкой {"u": id, "s": начало, "e": конец}
+в JSONL-файл. Суммы по дням, неделям и пользователям обновляются при записи,
+поэтому команды статистики не перечитывают историю.
+
+Выгрузка за период: python history.py [history.jsonl] 2026-01-01 2026-01-31 > shifts.csv
+"""
+import os
+import sys
+import csv
+import json
+import time
+import heapq
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+
+
+def day_key(timestamp):
+    """Дата по местному времени: YYYY-MM-DD"""
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+
+def week_key(timestamp):
+    """ISO-неделя по местному времени: YYYY-Www"""
+    return time.strftime("%G-W%V", time.localtime(timestamp))
+
+
+def split_by_days(start, end):
+    """Разбиение интервала на части по границам суток: (день, начало, конец)"""
+    while start < end:
+        local = time.localtime(start)
+        midnight = time.mktime((local.tm_year, local.tm_mon, local.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+        part_end = min(end, midnight)
+        yield day_key(start), start, part_end
+        start = part_end
+
+
+class ShiftHistory:
+    """Журнал завершенных смен и агрегаты по нему.
+
+    max_duration ограничивает длительность смены: сессия, удаленная по
+    истечению (в т.ч. после простоя бота), засчитывается не дольше TTL.
+    """
+
+    def __init__(self, path="history.jsonl", max_duration=None):
+        self.path = path
+        self.max_duration = max_duration
+        self._days = {}        # день -> {user_id: секунды}
+        self._day_totals = {}  # день -> [секунды, смен]
+        self._weeks = {}       # неделя -> {user_id: секунды}
+        self._users = {}       # user_id -> [секунды, смен]
+        self._lock = threading.Lock()
+        self._file = None
+
+    # ==== Запись ====
+    def load(self):
+        """Построение агрегатов по файлу истории (один проход при запуске)"""
+        if not os.path.exists(self.path):
+            return 0
+        count = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self._aggregate(int(record["u"]), record["s"], record["e"])
+                except (ValueError, KeyError, TypeError):
+                    # Недописанная строка после сбоя
+                    continue
+                count += 1
+        logger.info("Загружено %s смен из %s", count, self.path)
+        return count
+
+    def record(self, user_id, start_time, end_time=None):
+        """Завершенная смена: строка в файл и обновление агрегатов"""
+        end_time = time.time() if end_time is None else end_time
+        if self.max_duration is not None:
+            end_time = min(end_time, start_time + self.max_duration)
+        if end_time <= start_time:
+            return
+        uid = int(user_id)
+        line = json.dumps({"u": uid, "s": round(start_time, 3), "e": round(end_time, 3)})
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+                # Недописанная последняя строка не должна склеиться с новой
+                if self._file.tell() and not self._ends_with_newline():
+                    self._file.write("\n")
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._aggregate(uid, start_time, end_time)
+
+    def on_role_change(self, role, user_id, added, info):
+        """Слушатель RoleRegistry: снятие junior завершает смену"""
+        if role == "junior" and not added and info is not None:
+            self.record(user_id, info.start_time)
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _aggregate(self, uid, start, end):
+        user = self._users.setdefault(uid, [0.0, 0])
+        user[0] += end - start
+        user[1] += 1
+        started_day = day_key(start)
+        for day, part_start, part_end in split_by_days(start, end):
+            seconds = part_end - part_start
+            users = self._days.setdefault(day, {})
+            users[uid] = users.get(uid, 0.0) + seconds
+            totals = self._day_totals.setdefault(day, [0.0, 0])
+            totals[0] += seconds
+            # Смена считается в том дне, когда началась
+            if day == started_day:
+                totals[1] += 1
+            week = self._weeks.setdefault(week_key(part_start), {})
+            week[uid] = week.get(uid, 0.0) + seconds
+
+    # ==== Статистика ====
+    def top(self, period="week", limit=10, now=None):
+        """Лидеры по времени онлайн за текущий день или неделю: [(user_id, секунды)]"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if period == "day":
+                users = self._days.get(day_key(now), {})
+            else:
+                users = self._weeks.get(week_key(now), {})
+            return heapq.nlargest(limit, users.items(), key=lambda item: item[1])
+
+    def user_stats(self, user_id, now=None):
+        """Время пользователя: (за сегодня, за неделю, всего, смен всего)"""
+        now = time.time() if now is None else now
+        uid = int(user_id)
+        with self._lock:
+            today = self._days.get(day_key(now), {}).get(uid, 0.0)
+            week = self._weeks.get(week_key(now), {}).get(uid, 0.0)
+            total, shifts = self._users.get(uid, (0.0, 0))
+        return today, week, total, shifts
+
+    def day_totals(self, day):
+        """Итоги дня YYYY-MM-DD: (секунды, смен, людей)"""
+        with self._lock:
+            seconds, shifts = self._day_totals.get(day, (0.0, 0))
+            return seconds, shifts, len(self._days.get(day, ()))
+
+
+def iter_shifts(path, start=None, end=None):
+    """Потоковое чтение смен, начавшихся в [start, end)"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if start is not None and record["s"] < start:
+                continue
+            if end is not None and record["s"] >= end:
+                continue
+            yield record
+
+
+def export_csv(path, first_day, last_day, out):
+    """Выгрузка смен за дни first_day..last_day (включительно) в CSV"""
+    start = time.mktime(time.strptime(first_day, "%Y-%m-%d"))
+    end = time.mktime(time.strptime(last_day, "%Y-%m-%d")) + DAY
+    writer = csv.writer(out)
+    writer.writerow(["user_id", "start", "end", "seconds"])
+    count = 0
+    for record in iter_shifts(path, start, end):
+        writer.writerow([
+            record["u"],
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["s"])),
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["e"])),
+            int(record["e"] - record["s"]),
+        ])
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) not in (2, 3):
+        print(__doc__.strip().splitlines()[-1], file=sys.stderr)
+        sys.exit(2)
+    history_path = args[0] if len(args) == 3 else "history.jsonl"
+    exported = export_csv(history_path, args[-2], args[-1], sys.stdout)
+    print(f"Выгружено смен: {exported}", file=sys.stderr)
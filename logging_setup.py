@@ -0,0 +1,115 @@
+import os
+import copy
+import json
+import queue
+import atexit
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# event_id обрабатываемого события: добавляется ко всем записям из обработчика
+current_event = contextvars.ContextVar("current_event", default=None)
+
+
+class EventContextFilter(logging.Filter):
+    """Добавляет к записи event_id текущего события"""
+
+    def filter(self, record):
+        if not hasattr(record, "event_id"):
+            record.event_id = current_event.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись одной строкой JSON"""
+
+    # Дополнительные поля (extra=...), которые попадают в запись
+    FIELDS = ("event_id", "user_id", "handler", "duration_ms")
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class BufferedQueueHandler(QueueHandler):
+    """QueueHandler, который не блокирует обработку событий.
+
+    В вызывающем потоке только подставляются аргументы сообщения, вывод и
+    запись на диск выполняет QueueListener. При переполнении очереди запись
+    отбрасывается (счетчик dropped).
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Аргументы подставляются сразу: к моменту записи объекты могут измениться
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(path="logs/bot.log", level=logging.INFO, json_format=False,
+                      max_bytes=10 * 1024 * 1024, backup_count=5, rotate_when=None, queue_size=10000):
+    """Логирование через очередь и фоновый поток записи.
+
+    Файл ротируется по размеру (max_bytes) или по времени (rotate_when,
+    например "midnight"); json_format включает JSON-строки в файле.
+    Возвращает обработчик очереди (для счетчика отброшенных записей).
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if rotate_when:
+        file_handler = TimedRotatingFileHandler(path, when=rotate_when, backupCount=backup_count,
+                                                encoding='utf-8')
+    else:
+        file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                           encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT))
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.Queue(queue_size)
+    handler = BufferedQueueHandler(log_queue)
+    handler.addFilter(EventContextFilter())
+    listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener.start()
+    # При выходе дописываем очередь
+    atexit.register(listener.stop)
+    return handler
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from storage import write_json_atomic
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LongPollConsumer:
+    """Устойчивое чтение Bots Long Poll.
+
+    connect() создает VkBotLongPoll. При ошибке сети или сервера ключ
+    запрашивается заново с экспоненциальной задержкой, позиция ts при этом
+    сохраняется. В файл state_path периодически пишется контрольная точка:
+    ts перед самой старой пачкой с необработанными событиями и event_id уже
+    обработанных событий из пачек после него (только они придут повторно).
+    После перезапуска чтение продолжается с этой позиции, а повторно
+    полученные события отбрасываются по event_id (ограниченный LRU на
+    dedup_size записей).
+
+    listen() читает сам; async_bot.py читает в цикле asyncio и передает
+    пачки в accept(), ошибки — в failed().
+    """
+
+    def __init__(self, connect, state_path="longpoll_state.json", dedup_size=10000,
+                 backoff=1.0, max_backoff=60.0, save_every=1.0):
+        self.connect = connect
+        self.state_path = state_path
+        self.dedup_size = dedup_size
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.save_every = save_every
+        self.longpoll = None
+        self.reconnects = 0
+
+        self._seen = OrderedDict()  # event_id -> обработано ли
+        self._batches = deque()     # [ts перед пачкой, необработанных событий, event_id пачки]
+        self._pending = {}          # ключ события -> его пачка
+        self._saved_ts = None
+        self._last_save = 0.0
+        self._attempt = 0
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._load_state()
+
+    # ==== Контрольная точка ====
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Не удалось прочитать %s: %s", self.state_path, e)
+            return
+        self._saved_ts = state.get("ts")
+        for event_id in state.get("event_ids", [])[-self.dedup_size:]:
+            self._seen[event_id] = True
+        logger.info("Long poll продолжит с ts=%s, известно %s событий", self._saved_ts, len(self._seen))
+
+    @property
+    def resume_ts(self):
+        """Сохраненная позиция (None — читать с текущей позиции сервера)"""
+        return self._saved_ts
+
+    def checkpoint(self):
+        """Позиция, с которой безопасно продолжить после перезапуска"""
+        return self._checkpoint()[0]
+
+    def _checkpoint(self):
+        """Позиция и обработанные event_id, которые после нее придут повторно"""
+        with self._lock:
+            while self._batches and self._batches[0][1] == 0:
+                self._batches.popleft()
+            if self._batches:
+                done = [event_id for batch in self._batches for event_id in batch[2]
+                        if self._seen.get(event_id)]
+                return self._batches[0][0], done
+        return (self.longpoll.ts if self.longpoll is not None else self._saved_ts), []
+
+    def save(self):
+        """Запись контрольной точки (компактный JSON, обычно несколько event_id)"""
+        ts, done = self._checkpoint()
+        if ts is None:
+            return
+        write_json_atomic(self.state_path, {"ts": ts, "event_ids": done}, indent=None)
+        self._last_save = time.monotonic()
+
+    def done(self, event):
+        """Событие обработано (вызывается из потока обработчика)"""
+        event_id = event.raw.get("event_id")
+        with self._lock:
+            if event_id is not None and event_id in self._seen:
+                self._seen[event_id] = True
+            batch = self._pending.pop(id(event), None)
+            if batch is not None:
+                batch[1] -= 1
+
+    # ==== Чтение ====
+    def _remember(self, event_id):
+        self._seen[event_id] = False
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+
+    def _reconnect(self):
+        if self.longpoll is None:
+            self.longpoll = self.connect()
+            if self._saved_ts is not None:
+                self.longpoll.ts = self._saved_ts
+        else:
+            # Новый ключ, прежняя позиция
+            self.longpoll.update_longpoll_server(update_ts=False)
+
+    def listen(self):
+        """События по одному; повторы по event_id пропускаются"""
+        broken = True
+        while not self._stopped:
+            try:
+                if broken:
+                    self._reconnect()
+                    broken = False
+                ts_before = self.longpoll.ts
+                events = self.longpoll.check()
+            except Exception as e:
+                broken = True
+                time.sleep(self.failed(e))
+                continue
+
+            yield from self.accept(ts_before, events)
+            self.save_if_due()
+
+    def accept(self, ts_before, events):
+        """Пачка, полученная с позиции ts_before: новые события (повторы по
+        event_id отбрасываются) учитываются в контрольной точке"""
+        self._recovered()
+        batch = [ts_before, 0, []]
+        fresh = []
+        with self._lock:
+            for event in events:
+                event_id = event.raw.get("event_id")
+                if event_id is not None:
+                    if event_id in self._seen:
+                        metrics.inc("bot_longpoll_duplicates_total")
+                        continue
+                    self._remember(event_id)
+                    batch[2].append(event_id)
+                batch[1] += 1
+                self._pending[id(event)] = batch
+                fresh.append(event)
+            if fresh:
+                self._batches.append(batch)
+        return fresh
+
+    def failed(self, error):
+        """Ошибка чтения; возвращает задержку перед повтором, с"""
+        if self._failed_at is None:
+            self._failed_at = time.monotonic()
+        delay = min(self.max_backoff, self.backoff * 2 ** self._attempt) * random.uniform(0.5, 1.0)
+        self._attempt += 1
+        metrics.inc("bot_longpoll_errors_total")
+        logger.warning("Ошибка long poll (%s), повтор через %.1f с", error, delay)
+        return delay
+
+    def _recovered(self):
+        if self._failed_at is None:
+            return
+        latency = time.monotonic() - self._failed_at
+        self.reconnects += 1
+        metrics.inc("bot_longpoll_reconnects_total")
+        metrics.observe("bot_longpoll_reconnect_seconds", latency)
+        logger.info("Long poll восстановлен за %.1f с (попыток: %s)", latency, self._attempt)
+        self._failed_at = None
+        self._attempt = 0
+
+    def save_if_due(self):
+        """Запись контрольной точки не чаще save_every секунд"""
+        if time.monotonic() - self._last_save >= self.save_every:
+            self._save_quietly()
+
+    def _save_quietly(self):
+        try:
+            self.save()
+        except OSError as e:
+            logger.error("Ошибка записи %s: %s", self.state_path, e)
+
+    def close(self):
+        """Остановка чтения и запись контрольной точки"""
+        self._stopped = True
+        self._save_quietly()
@@ -0,0 +1,192 @@
+import time
+import logging
+import threading
+from collections import deque
+
+import requests
+from vk_api.exceptions import ApiError, ApiHttpError
+from vk_api.requests_pool import VkRequestsPool
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Коды ошибок VK, после которых запрос стоит повторить:
+# 6 — слишком много запросов в секунду, 9 — flood control, 10 — внутренняя ошибка
+RETRY_ERROR_CODES = {6, 9, 10}
+
+# Максимум вызовов API в одном execute
+EXECUTE_BATCH_SIZE = 25
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов (token bucket)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Ожидание свободного токена"""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                time.sleep((1 - self.tokens) / self.rate)
+
+
+class OutgoingCall:
+    """Вызов API в очереди"""
+
+    __slots__ = ("method", "values", "on_done", "attempts")
+
+    def __init__(self, method, values, on_done=None):
+        self.method = method
+        self.values = values
+        self.on_done = on_done
+        self.attempts = 0
+
+
+class Outbox:
+    """Очередь исходящих вызовов API.
+
+    Накопившиеся вызовы отправляются пачками до 25 штук одним execute, число
+    запросов ограничено token bucket (rate в секунду — лимит токена группы).
+    При flood control и ошибках 5xx пачка или отдельный вызов повторяются с
+    экспоненциальной задержкой, после max_retries попыток вызов отбрасывается.
+    """
+
+    def __init__(self, vk_session, rate=20, max_retries=3, backoff=1.0, max_queue=10000):
+        self.vk_session = vk_session
+        self.bucket = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_queue = max_queue
+
+        self.delivered = 0
+        self.retried = 0
+        self.dropped = 0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def stats(self):
+        """Счетчики доставки"""
+        return {
+            "queued": len(self._queue),
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "dropped": self.dropped,
+        }
+
+    def send(self, method, values, on_done=None):
+        """Поставить вызов в очередь; on_done() вызывается после доставки"""
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                logger.error("Очередь исходящих переполнена, %s отброшен", method)
+                return
+            self._queue.append(OutgoingCall(method, values, on_done))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def stop(self, timeout=10):
+        """Отправка оставшихся вызовов и остановка потока"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        logger.info("Исходящие: %s", self.stats())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                batch = [self._queue.popleft() for _ in range(min(EXECUTE_BATCH_SIZE, len(self._queue)))]
+
+            self.bucket.acquire()
+            retry = self._execute(batch)
+            if retry:
+                self._requeue(retry)
+
+    def _execute(self, batch):
+        """Отправка пачки; возвращает вызовы для повтора"""
+        pool = VkRequestsPool(self.vk_session)
+        results = [pool.method(call.method, call.values) for call in batch]
+        try:
+            with metrics.timer("vk_api_request_seconds", method="execute"):
+                pool.execute()
+        except ApiError as e:
+            metrics.inc("vk_api_errors_total", code=e.code)
+            if e.code in RETRY_ERROR_CODES:
+                return batch
+            self._drop(batch, e)
+            return []
+        except ApiHttpError as e:
+            metrics.inc("vk_api_errors_total", code=f"http_{e.response.status_code}")
+            if e.response.status_code >= 500:
+                return batch
+            self._drop(batch, e)
+            return []
+        except requests.RequestException as e:
+            metrics.inc("vk_api_errors_total", code="network")
+            logger.warning("Сетевая ошибка при отправке: %s", e)
+            return batch
+        except Exception as e:
+            self._drop(batch, e)
+            return []
+
+        retry = []
+        for call, result in zip(batch, results):
+            error = result.error or {}
+            if result.ok:
+                self.delivered += 1
+                if call.on_done is not None:
+                    call.on_done()
+            elif error.get("error_code") in RETRY_ERROR_CODES:
+                metrics.inc("vk_api_errors_total", code=error["error_code"])
+                retry.append(call)
+            else:
+                metrics.inc("vk_api_errors_total", code=error.get("error_code", "none"))
+                self._drop([call], error.get("error_msg", "нет ответа"))
+        return retry
+
+    def _requeue(self, calls):
+        """Повтор с задержкой; вызовы возвращаются в начало очереди (порядок сохраняется)"""
+        attempts = max(call.attempts for call in calls) + 1
+        alive = []
+        for call in calls:
+            call.attempts += 1
+            if call.attempts > self.max_retries:
+                self._drop([call], "исчерпаны попытки")
+            else:
+                alive.append(call)
+        if not alive:
+            return
+
+        self.retried += len(alive)
+        delay = self.backoff * 2 ** (attempts - 1)
+        logger.warning("Повтор %s вызовов через %.1f с", len(alive), delay)
+        time.sleep(delay)
+        with self._cond:
+            self._queue.extendleft(reversed(alive))
+
+    def _drop(self, calls, error):
+        self.dropped += len(calls)
+        logger.error("Не удалось выполнить %s вызовов (%s): %s", len(calls), calls[0].method, error)
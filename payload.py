@@ -0,0 +1,55 @@
+import json
+import logging
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Ограничение VK на payload кнопки — 255 символов; запас на случай изменений
+MAX_PAYLOAD_SIZE = 1024
+
+
+class PayloadDecoder:
+    """Разбор payload кнопок.
+
+    Payload постоянных кнопок известны заранее: строка ищется в таблице
+    готовых значений (один поиск в словаре). Остальные строки (например,
+    кнопки листания) разбираются json.loads; слишком длинные, битые и не
+    являющиеся объектом payload отбрасываются. Таблица заменяется целиком,
+    поэтому чтение идет без блокировок. Значения из таблицы общие для всех
+    сообщений — обработчики их не изменяют.
+    """
+
+    def __init__(self, max_size=MAX_PAYLOAD_SIZE):
+        self.max_size = max_size
+        self.known = {}
+
+    def set_known(self, payloads):
+        """Таблица известных payload: {JSON-строка: разобранный объект}"""
+        self.known = {raw: json.loads(raw) for raw in payloads}
+
+    def decode(self, raw):
+        """Payload-объект (dict) или None"""
+        if not raw:
+            return None
+        if isinstance(raw, dict):
+            return raw
+        if not isinstance(raw, str):
+            return self._reject("type", raw)
+        payload = self.known.get(raw)
+        if payload is not None:
+            return payload
+        if len(raw) > self.max_size:
+            return self._reject("size", raw)
+        try:
+            payload = json.loads(raw)
+        except ValueError:
+            return self._reject("malformed", raw)
+        if not isinstance(payload, dict):
+            return self._reject("malformed", raw)
+        return payload
+
+    def _reject(self, reason, raw):
+        metrics.inc("bot_payload_rejected_total", reason=reason)
+        logger.warning("Отброшен payload (%s): %.64r", reason, raw)
+        return None
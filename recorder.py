@@ -0,0 +1,174 @@
+"""Запись входящих событий long poll для воспроизведения (replay.py).
+
+События пишутся в gzip JSONL обезличенными: ID пользователей и бесед
+заменяются псевдонимами (HMAC с солью: RECORD_SALT или случайной на запуск),
+ссылки и упоминания — на псевдонимы, произвольный текст маскируется,
+вложения сводятся к типу. Первая строка — заголовок с псевдонимами
+руководства, чтобы при воспроизведении работали команды руководства.
+"""
+import os
+import re
+import gzip
+import hmac
+import json
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CHAT_PEER_OFFSET = 2000000000
+
+# Упоминание [id123|Имя Фамилия] (с пробелами внутри — заменяется до разбиения на слова)
+MENTION_RE = re.compile(r"\[(id|club|public)(\d+)\|[^\]]*\]")
+# Ссылка на пользователя: id123, 123, vk.com/name, @name
+REF_RE = re.compile(r"((?:https?://)?(?:m\.)?vk\.com/|@)?([\w.]+)")
+# Поля сообщения, которые нужны обработчикам
+MESSAGE_FIELDS = ("date", "from_id", "peer_id", "text", "payload", "id", "conversation_message_id")
+
+
+class Anonymizer:
+    """Замена ID и ссылок на псевдонимы (стабильные для одной соли)"""
+
+    def __init__(self, salt):
+        self.salt = salt
+
+    def _hash(self, value):
+        digest = hmac.new(self.salt, str(value).encode("utf-8"), hashlib.sha256).digest()
+        return int.from_bytes(digest[:8], "big")
+
+    def user_id(self, user_id):
+        """Псевдоним ID: пользователи — 9 цифр, беседы остаются беседами, сообщества — отрицательными"""
+        user_id = int(user_id)
+        if user_id >= CHAT_PEER_OFFSET:
+            return CHAT_PEER_OFFSET + 1 + self._hash(user_id) % 1000000
+        if user_id < 0:
+            return -(1 + self._hash(user_id) % 100000000)
+        if user_id == 0:
+            return 0
+        return 100000000 + self._hash(user_id) % 900000000
+
+    def _ref(self, token, bare=False):
+        """Обезличенная ссылка на пользователя или None, если слово — не ссылка.
+        bare=True — слово без префикса тоже считается коротким именем"""
+        match = REF_RE.fullmatch(token)
+        if match is None:
+            return None
+        prefix, name = match.group(1) or "", match.group(2)
+        if name.isdigit():
+            return f"{prefix}{self.user_id(name)}"
+        if name.startswith("id") and name[2:].isdigit():
+            return f"{prefix}id{self.user_id(name[2:])}"
+        if prefix or bare:
+            return f"{prefix}u{self._hash(name.lower()) % 10 ** 10}"
+        return None
+
+    def text(self, text):
+        """Текст команды: имя команды и первый параметр (группа, период, дата)
+        сохраняются, если это не ссылка; дальше идут пользователи — заменяется
+        каждое слово, в т.ч. короткие имена без префикса.
+        Остальной текст: ссылки заменяются, прочие слова маскируются"""
+        text = MENTION_RE.sub(lambda m: f"[{m.group(1)}{self.user_id(m.group(2))}|user]", text)
+        words = text.split()
+        command = text.startswith("/")
+        result = []
+        for i, word in enumerate(words):
+            if (command and i == 0) or MENTION_RE.fullmatch(word):
+                result.append(word)
+                continue
+            if command and i > 1:
+                # Список пользователей, в т.ч. через запятую: durov,@team
+                result.append(REF_RE.sub(lambda m: self._ref(m.group(0), bare=True), word))
+                continue
+            ref = self._ref(word)
+            if ref is not None:
+                result.append(ref)
+            else:
+                result.append(word if command else "*" * len(word))
+        return " ".join(result)
+
+    def event(self, raw):
+        """Обезличенная копия raw-события"""
+        result = {key: raw[key] for key in ("type", "event_id", "group_id") if key in raw}
+        obj = raw.get("object") or {}
+        message = obj.get("message")
+        if message is None:
+            return result
+        clean = {key: message[key] for key in MESSAGE_FIELDS if key in message}
+        for key in ("from_id", "peer_id"):
+            if key in clean:
+                clean[key] = self.user_id(clean[key])
+        if clean.get("text"):
+            clean["text"] = self.text(clean["text"])
+        if message.get("attachments"):
+            clean["attachments"] = [{"type": a.get("type")} for a in message["attachments"]]
+        result["object"] = {"message": clean, "client_info": obj.get("client_info", {})}
+        return result
+
+
+class EventRecorder:
+    """Запись событий в gzip JSONL: {"t": время получения, "event": обезличенное событие}"""
+
+    def __init__(self, path, management_ids=(), salt=None):
+        self.path = path
+        self.anonymizer = Anonymizer(salt or os.urandom(16))
+        self.recorded = 0
+        self._lock = threading.Lock()
+        # Дозапись в существующий файл добавляет новый член gzip — файл остается читаемым
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        header = {"version": 1, "started": time.time(),
+                  "management": [self.anonymizer.user_id(uid) for uid in management_ids]}
+        self._write({"header": header})
+        logger.info("Запись событий в %s", path)
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def record(self, event):
+        """Запись события (ошибки записи не мешают обработке)"""
+        try:
+            line = {"t": round(time.time(), 3), "event": self.anonymizer.event(event.raw)}
+            with self._lock:
+                if self._file is None:
+                    return
+                self._write(line)
+                self.recorded += 1
+        except Exception as e:
+            logger.error("Ошибка записи события: %s", e)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        logger.info("Записано %s событий в %s", self.recorded, self.path)
+
+
+def load_recording(path):
+    """Заголовок и список строк {"t", "event"}.
+
+    При дозаписи в файл заголовков несколько (по одному на запуск) —
+    руководство объединяется, остальное берется из первого."""
+    header = None
+    records = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Недописанная строка после сбоя
+                    continue
+                if "header" in record:
+                    if header is None:
+                        header = record["header"]
+                    else:
+                        header["management"] = list(dict.fromkeys(
+                            header.get("management", []) + record["header"].get("management", [])))
+                else:
+                    records.append(record)
+        except EOFError:
+            # Файл оборван (процесс остановлен без закрытия) — берем прочитанное
+            logger.warning("Запись %s оборвана, прочитано %s событий", path, len(records))
+    return header or {}, records
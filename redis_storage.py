@@ -0,0 +1,231 @@
+import json
+import uuid
+import logging
+import threading
+
+import redis
+
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class RedisStorage(Storage):
+    """Общее хранилище для нескольких процессов бота (Redis или совместимый сервер).
+
+    Ключи (с префиксом prefix):
+      sessions                  — хэш user_id -> JSON записи сессии
+      senior_admins, management — списки ID в порядке добавления
+      input:<user_id>           — ожидаемый ввод пользователя (со сроком жизни)
+      changes                   — канал уведомлений об изменениях
+
+    Вход и выход атомарны на сервере (HSETNX и HDEL), поэтому
+    одну сессию не откроют и не закроют дважды разные процессы. После
+    каждого изменения в канал публикуется {"kind", "id", "origin"}, по
+    которому остальные процессы обновляют свое состояние.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="vkbot:", client=None):
+        self.client = client if client is not None else redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.instance_id = uuid.uuid4().hex
+        self.sessions_key = prefix + "sessions"
+        self.channel = prefix + "changes"
+        self._pubsub = None
+        self._thread = None
+
+    def _role_key(self, role):
+        return self.prefix + role
+
+    def load(self):
+        admins = self.load_sessions()
+        roles = [self.load_role(role) for role in self.ROLES]
+        logger.info("Состояние загружено из Redis (%s)", self.prefix)
+        return (admins, *roles)
+
+    def load_sessions(self):
+        """Все сессии из общего хранилища: {str(user_id): запись}"""
+        sessions = self.client.hgetall(self.sessions_key)
+        return {key.decode(): json.loads(value) for key, value in sessions.items()}
+
+    def load_session(self, user_id):
+        """Запись сессии из общего хранилища (или None)"""
+        value = self.client.hget(self.sessions_key, str(user_id))
+        return json.loads(value) if value is not None else None
+
+    def load_role(self, role):
+        """Список ID роли из общего хранилища"""
+        return [int(uid) for uid in self.client.lrange(self._role_key(role), 0, -1)]
+
+    def save_admins(self, admins, user_ids=None):
+        pipe = self.client.pipeline(transaction=True)
+        if user_ids is None:
+            pipe.delete(self.sessions_key)
+            if admins:
+                pipe.hset(self.sessions_key, mapping={uid: json.dumps(info.to_dict(), ensure_ascii=False)
+                                                      for uid, info in admins.items()})
+            self._publish(pipe, "sessions")
+        else:
+            for user_id in user_ids:
+                info = admins.get(str(user_id))
+                if info is None:
+                    pipe.hdel(self.sessions_key, str(user_id))
+                else:
+                    pipe.hset(self.sessions_key, str(user_id), json.dumps(info.to_dict(), ensure_ascii=False))
+                self._publish(pipe, "session", int(user_id))
+        pipe.execute()
+
+    def save_role(self, role, user_ids):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._role_key(role))
+        if user_ids:
+            pipe.rpush(self._role_key(role), *user_ids)
+        self._publish(pipe, role)
+        pipe.execute()
+
+    def claim_session(self, user_id, info):
+        return bool(self.client.hsetnx(self.sessions_key, str(user_id),
+                                       json.dumps(info.to_dict(), ensure_ascii=False)))
+
+    def release_session(self, user_id):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hdel(self.sessions_key, str(user_id))
+        self._publish(pipe, "session", int(user_id))
+        deleted, _ = pipe.execute()
+        return bool(deleted)
+
+    # ==== Уведомления ====
+    def _publish(self, pipe, kind, user_id=None):
+        pipe.publish(self.channel, json.dumps({"kind": kind, "id": user_id, "origin": self.instance_id}))
+
+    def subscribe(self, callback):
+        """Фоновый поток: callback(kind, user_id) на изменения других процессов"""
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(self.channel)
+        self._thread = threading.Thread(target=self._listen, args=(callback,), name="redis-sync", daemon=True)
+        self._thread.start()
+
+    def _listen(self, callback):
+        for message in self._pubsub.listen():
+            try:
+                change = json.loads(message["data"])
+                if change.get("origin") != self.instance_id:
+                    callback(change["kind"], change.get("id"))
+            except Exception as e:
+                logger.error("Ошибка применения изменения из Redis: %s", e, exc_info=True)
+
+    def pending_input(self, ttl):
+        # Диалог, начатый в одном процессе, продолжает новый ведущий
+        return RedisPendingInput(self.client, self.prefix + "input:", ttl)
+
+    def leader_lock(self, name="leader", ttl=30.0, on_lost=None):
+        """Блокировка ведущего процесса (единственного потребителя long poll)"""
+        return LeaderLock(self.client, self.prefix + name, self.instance_id, ttl, on_lost)
+
+    def close(self):
+        if self._pubsub is not None:
+            try:
+                self._pubsub.close()
+            except Exception as e:
+                logger.error("Ошибка закрытия подписки Redis: %s", e)
+
+
+class RedisPendingInput:
+    """Ожидаемый ввод пользователей в Redis (как session.PendingInput).
+
+    Запись — ключ с префиксом и user_id, брошенный диалог истекает через
+    ttl секунд на сервере. pop() читает и удаляет ключ в одной транзакции,
+    поэтому ответ не обработают дважды.
+    """
+
+    def __init__(self, client, prefix, ttl=300):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def set(self, user_id, action):
+        """Ожидание ввода для действия action"""
+        self.client.set(self.prefix + str(user_id), action, px=int(self.ttl * 1000))
+
+    def pop(self, user_id):
+        """Ожидаемое действие (или None) — запись удаляется"""
+        pipe = self.client.pipeline(transaction=True)
+        pipe.get(self.prefix + str(user_id))
+        pipe.delete(self.prefix + str(user_id))
+        action, _ = pipe.execute()
+        return action.decode() if action is not None else None
+
+
+class LeaderLock:
+    """Выбор ведущего процесса: ключ SET NX PX с продлением.
+
+    Ключ хранит instance_id владельца и живет ttl секунд; владелец продлевает
+    его каждые ttl/3 секунд. Если продлить не удалось (ключ истек и занят
+    другим процессом), выставляется событие lost и в потоке продления
+    вызывается on_lost — остановить задачи, которые выполняет только ведущий.
+    """
+
+    def __init__(self, client, key, owner, ttl=30.0, on_lost=None):
+        self.client = client
+        self.key = key
+        self.owner = owner
+        self.ttl = ttl
+        self.on_lost = on_lost
+        self.lost = threading.Event()
+        self._stopped = threading.Event()
+
+    def acquire(self, blocking=True):
+        """Попытка стать ведущим; при blocking ждет освобождения ключа"""
+        while not self._stopped.is_set():
+            if self.client.set(self.key, self.owner, nx=True, px=int(self.ttl * 1000)):
+                self.lost.clear()
+                threading.Thread(target=self._renew_loop, name="leader-renew", daemon=True).start()
+                return True
+            if not blocking:
+                return False
+            self._stopped.wait(self.ttl / 3)
+        return False
+
+    def renew(self):
+        """Продление ключа, если он все еще наш (WATCH + MULTI)"""
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.get(self.key) != self.owner.encode():
+                    return False
+                pipe.multi()
+                pipe.pexpire(self.key, int(self.ttl * 1000))
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def release(self):
+        """Снятие ключа при остановке (только своего)"""
+        self._stopped.set()
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.get(self.key) == self.owner.encode():
+                    pipe.multi()
+                    pipe.delete(self.key)
+                    pipe.execute()
+            except redis.WatchError:
+                pass
+
+    def _renew_loop(self):
+        while not self._stopped.wait(self.ttl / 3):
+            try:
+                renewed = self.renew()
+            except redis.RedisError as e:
+                logger.error("Ошибка продления лидерства: %s", e)
+                renewed = False
+            if not renewed:
+                logger.warning("Лидерство потеряно")
+                self.lost.set()
+                if self.on_lost is not None:
+                    try:
+                        self.on_lost()
+                    except Exception as e:
+                        logger.error("Ошибка обработки потери лидерства: %s", e, exc_info=True)
+                return
@@ -0,0 +1,141 @@
+"""Воспроизведение записанных событий (RECORD_EVENTS) на фейковом VK API.
+
+События обрабатываются последовательно в пустом рабочем каталоге, с
+паузами как при записи (--speed 1), быстрее (--speed N) или без пауз
+(--speed 0). Отчет: стоимость обработки по командам, с --profile —
+самые горячие функции (cProfile), с --tracemalloc — места наибольшего
+выделения памяти.
+
+Пример: python replay.py events.jsonl.gz --speed 0 --profile --tracemalloc
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import cProfile
+import pstats
+import tracemalloc
+
+# Каталог с bot.py — для запуска из любой папки
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def command_name(raw):
+    """Команда события для отчета: /команда, действие кнопки или <текст>"""
+    message = (raw.get("object") or {}).get("message") or {}
+    text = message.get("text") or ""
+    if text.startswith("/"):
+        return text.split()[0].lower()
+    payload = message.get("payload")
+    if payload:
+        try:
+            payload = json.loads(payload) if isinstance(payload, str) else payload
+            return str(payload.get("command"))
+        except (ValueError, AttributeError):
+            return "<payload>"
+    return "<текст>" if text else "<" + raw.get("type", "?") + ">"
+
+
+def replay(records, bot, speed=0.0):
+    """Последовательная обработка; возвращает {команда: [длительности, с]} и общее время"""
+    from vk_api.bot_longpoll import VkBotLongPoll
+
+    costs = {}
+    first_time = records[0]["t"] if records else 0
+    started = time.perf_counter()
+    for record in records:
+        if speed:
+            delay = (record["t"] - first_time) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        raw = record["event"]
+        event = VkBotLongPoll.CLASS_BY_EVENT_TYPE.get(raw.get("type"), VkBotLongPoll.DEFAULT_EVENT_CLASS)(raw)
+        event_started = time.perf_counter()
+        bot.handle_event(event)
+        costs.setdefault(command_name(raw), []).append(time.perf_counter() - event_started)
+    return costs, time.perf_counter() - started
+
+
+def cost_report(costs, elapsed):
+    """Стоимость по командам: количество, сумма, среднее, p95, доля времени"""
+    from bench import percentile
+
+    total = sum(sum(values) for values in costs.values()) or 1.0
+    count = sum(len(values) for values in costs.values())
+    lines = [
+        f"Событий: {count}, обработка {total:.3f} с, всего {elapsed:.3f} с",
+        f"{'команда':<24} {'событий':>8} {'сумма, мс':>10} {'сред, мс':>9} {'p95, мс':>9} {'доля':>6}",
+    ]
+    for name, values in sorted(costs.items(), key=lambda item: sum(item[1]), reverse=True):
+        values.sort()
+        spent = sum(values)
+        lines.append(f"{name:<24} {len(values):>8} {spent * 1000:>10.1f} {spent / len(values) * 1000:>9.3f} "
+                     f"{percentile(values, 0.95) * 1000:>9.3f} {spent / total:>6.1%}")
+    return "\n".join(lines)
+
+
+def memory_report(snapshot, limit):
+    """Места наибольшего выделения памяти"""
+    lines = ["Память (по строкам):"]
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        lines.append(f"  {stat.size / 1024:8.1f} КБ {stat.count:>7}  {frame.filename}:{frame.lineno}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных событий на фейковом VK API")
+    parser.add_argument("recording", help="файл записи (.jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="скорость относительно записи (1 — как записано, 0 — без пауз)")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа API, с")
+    parser.add_argument("--profile", action="store_true", help="отчет cProfile по функциям")
+    parser.add_argument("--tracemalloc", action="store_true", help="отчет по выделению памяти")
+    parser.add_argument("--top", type=int, default=25, help="строк в отчетах профилирования")
+    parser.add_argument("--sort", default="cumulative", help="сортировка cProfile (cumulative, tottime, ...)")
+    parser.add_argument("--stats-file", help="сохранить данные cProfile (для snakeviz и т.п.)")
+    args = parser.parse_args(argv)
+
+    from recorder import load_recording
+    from bench import prepare_bot, attach_fake_api
+    from fake_vk import FakeVkApi
+
+    header, records = load_recording(args.recording)
+    print(f"Запись: {len(records)} событий, руководство: {len(header.get('management', []))}")
+
+    workdir = tempfile.mkdtemp(prefix="bot-replay-")
+    bot = prepare_bot(workdir, header.get("management", []))
+    fake = FakeVkApi(latency=args.latency)
+    attach_fake_api(bot, fake)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if args.tracemalloc:
+        tracemalloc.start(10)
+    if profiler is not None:
+        profiler.enable()
+    costs, elapsed = replay(records, bot, args.speed)
+    if profiler is not None:
+        profiler.disable()
+    snapshot = tracemalloc.take_snapshot() if args.tracemalloc else None
+    bot.client.outbox.stop(timeout=60)
+
+    print(cost_report(costs, elapsed))
+    print(f"Запросов к API: {fake.total_calls}, сообщений: {fake.sent_messages}")
+    if profiler is not None:
+        print(f"\nГорячие функции ({args.sort}):")
+        stats = pstats.Stats(profiler, stream=sys.stdout)
+        stats.strip_dirs().sort_stats(args.sort).print_stats(args.top)
+        if args.stats_file:
+            stats.dump_stats(args.stats_file)
+    if snapshot is not None:
+        tracemalloc.stop()
+        print(memory_report(snapshot, args.top))
+    print(f"Рабочий каталог: {workdir}")
+
+
+if __name__ == "__main__":
+    main()
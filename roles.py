@@ -0,0 +1,106 @@
+from session import Session
+
+
+class RoleRegistry:
+    """Реестр ролей и присутствия с проверками за O(1).
+
+    Хранит множества ID (int) по ролям и карту id -> роль, обновляемые
+    при каждом добавлении/удалении. Исходные структуры (словарь admins со
+    строковыми ключами и списки senior_admins/management из int) изменяются
+    вместе с реестром, поэтому сохраняются в прежнем формате файлов.
+    Записи сессий в admins хранятся как Session.
+    """
+
+    # Роли в порядке приоритета (как в get_user_role)
+    ROLES = ("management", "senior", "junior")
+
+    def __init__(self, admins, senior_admins, management):
+        self.admins = admins
+        self.lists = {"senior": senior_admins, "management": management}
+
+        # Приводим списки ролей к int без повторов (раньше могли попадаться
+        # строки, в т.ч. дубли вида 5 и "5"), а ключи admins — к виду str(int).
+        # Роли с исправленными списками — в normalized, их нужно сохранить
+        self.normalized = []
+        for role, ids in self.lists.items():
+            unique = list(dict.fromkeys(int(uid) for uid in ids))
+            if unique != ids:
+                self.normalized.append(role)
+            ids[:] = unique
+        for key in list(admins):
+            info = Session.from_dict(admins.pop(key))
+            admins[str(int(key))] = info
+
+        self._members = {
+            "management": set(management),
+            "senior": set(senior_admins),
+            "junior": {int(uid) for uid in admins},
+        }
+        self._roles = {}
+        self._listeners = []
+        for role in reversed(self.ROLES):
+            for uid in self._members[role]:
+                self._roles[uid] = role
+
+    def add_listener(self, callback):
+        """Подписка на изменения: callback(role, user_id, added, info)"""
+        self._listeners.append(callback)
+
+    def role_of(self, user_id):
+        """Роль пользователя: management, senior, junior или none"""
+        return self._roles.get(int(user_id), "none")
+
+    def has(self, role, user_id):
+        """Состоит ли пользователь в роли"""
+        return int(user_id) in self._members[role]
+
+    def members(self, role):
+        """Множество ID роли (только для чтения)"""
+        return self._members[role]
+
+    def count(self, role):
+        """Число членов роли"""
+        return len(self._members[role])
+
+    def add(self, role, user_id, info=None):
+        """Добавление в роль; для junior info — запись сессии (Session или словарь).
+        False, если уже состоит"""
+        uid = int(user_id)
+        if uid in self._members[role]:
+            return False
+        if role == "junior":
+            info = Session.from_dict(info)
+            self.admins[str(uid)] = info
+        else:
+            self.lists[role].append(uid)
+        self._members[role].add(uid)
+        self._update(uid)
+        self._notify(role, uid, True, info)
+        return True
+
+    def remove(self, role, user_id):
+        """Удаление из роли. False, если пользователь в ней не состоял"""
+        uid = int(user_id)
+        if uid not in self._members[role]:
+            return False
+        if role == "junior":
+            info = self.admins.pop(str(uid))
+        else:
+            info = None
+            self.lists[role].remove(uid)
+        self._members[role].discard(uid)
+        self._update(uid)
+        self._notify(role, uid, False, info)
+        return True
+
+    def _update(self, uid):
+        """Пересчет роли одного пользователя после изменения"""
+        for role in self.ROLES:
+            if uid in self._members[role]:
+                self._roles[uid] = role
+                return
+        self._roles.pop(uid, None)
+
+    def _notify(self, role, uid, added, info):
+        for callback in self._listeners:
+            callback(role, uid, added, info)
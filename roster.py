@@ -0,0 +1,65 @@
+import time
+import threading
+from itertools import islice
+
+
+class Roster:
+    """Список младших администраторов онлайн в виде готовых строк.
+
+    Строка "[idN|Имя Фамилия]" формируется один раз при входе и удаляется
+    при выходе (через подписку на RoleRegistry), при выводе пересчитывается
+    только время онлайн. Длинный список делится на страницы по page_size
+    строк, чтобы сообщение не превышало лимит длины VK.
+    """
+
+    def __init__(self, format_time, page_size=40):
+        self.format_time = format_time
+        self.page_size = max(1, page_size)
+        self._entries = {}  # user_id -> (готовая ссылка, start_time), в порядке входа
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, user_id, info):
+        """Новая сессия (Session): строка формируется один раз"""
+        entry = (f"[id{user_id}|{info.first_name} {info.last_name}]", info.start_time)
+        with self._lock:
+            self._entries[int(user_id)] = entry
+
+    def discard(self, user_id):
+        """Сессия завершена"""
+        with self._lock:
+            self._entries.pop(int(user_id), None)
+
+    def on_role_change(self, role, user_id, added, info):
+        """Слушатель RoleRegistry: отслеживаются только сессии junior"""
+        if role != "junior":
+            return
+        if added:
+            self.add(user_id, info)
+        else:
+            self.discard(user_id)
+
+    def render_page(self, page, now):
+        """Строки страницы page (с 1), ее номер и число страниц; page приводится к допустимому"""
+        with self._lock:
+            pages = max(1, -(-len(self._entries) // self.page_size))
+            page = min(max(1, page), pages)
+            offset = (page - 1) * self.page_size
+            entries = list(islice(self._entries.values(), offset, offset + self.page_size))
+
+        lines = []
+        for i, (link, start_time) in enumerate(entries, start=offset + 1):
+            online_time = now - start_time
+            lines.append(f"{i}. {link} — ⏱ {self.format_time(online_time)}")
+        return lines, page, pages
+
+    def render_since(self, limit):
+        """Первые limit строк со временем входа (не меняются, пока состав тот же) и всего записей"""
+        with self._lock:
+            total = len(self._entries)
+            entries = list(islice(self._entries.values(), limit))
+        lines = [f"{i}. {link} — с {time.strftime('%H:%M', time.localtime(start_time))}"
+                 for i, (link, start_time) in enumerate(entries, start=1)]
+        return lines, total
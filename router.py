@@ -0,0 +1,88 @@
+import time
+import logging
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Request:
+    """Входящее сообщение, переданное обработчику команды"""
+
+    __slots__ = ("peer_id", "user_id", "text", "args", "payload", "attachments", "client")
+
+    def __init__(self, peer_id, user_id, text, args=None, payload=None, attachments=None, client=None):
+        self.peer_id = peer_id
+        self.user_id = user_id
+        self.text = text
+        self.args = args or []
+        self.payload = payload
+        self.attachments = attachments or []
+        # GroupClient группы, получившей сообщение (через нее отправляется ответ)
+        self.client = client
+
+
+class Route:
+    """Обработчик с требуемой ролью и ответом при отказе"""
+
+    __slots__ = ("handler", "permission", "denied")
+
+    def __init__(self, handler, permission=None, denied=None):
+        self.handler = handler
+        self.permission = permission
+        self.denied = denied
+
+
+class CommandRouter:
+    """Таблицы текстовых команд и payload-действий.
+
+    Таблицы заполняются один раз при импорте через декораторы, выбор
+    обработчика — один поиск в словаре. has_permission(permission, user_id)
+    проверяет права, deny(request, text) отправляет ответ при отказе.
+    """
+
+    def __init__(self, has_permission, deny):
+        self.has_permission = has_permission
+        self.deny = deny
+        self.commands = {}
+        self.actions = {}
+
+    def command(self, *names, permission=None, denied=None):
+        """Регистрация обработчика текстовой команды (/name)"""
+        return self._register(self.commands, names, permission, denied)
+
+    def action(self, *names, permission=None, denied=None):
+        """Регистрация обработчика payload-действия"""
+        return self._register(self.actions, names, permission, denied)
+
+    def _register(self, table, names, permission, denied):
+        def decorator(handler):
+            for name in names:
+                table[name] = Route(handler, permission, denied)
+            return handler
+        return decorator
+
+    def dispatch_command(self, name, request):
+        """Выполнение текстовой команды; False, если команда не найдена или запрещена"""
+        return self._dispatch(self.commands.get(name), name, request)
+
+    def dispatch_action(self, name, request):
+        """Выполнение payload-действия; False, если действие не найдено или запрещено"""
+        return self._dispatch(self.actions.get(name), name, request)
+
+    def _dispatch(self, route, name, request):
+        if route is None:
+            return False
+        if route.permission is not None and not self.has_permission(route.permission, request.user_id):
+            metrics.inc("bot_handler_denied_total", handler=name)
+            if route.denied:
+                self.deny(request, route.denied)
+            return False
+        started = time.perf_counter()
+        with metrics.timer("bot_handler_seconds", handler=name):
+            route.handler(request, name)
+        if logger.isEnabledFor(logging.DEBUG):
+            duration_ms = round((time.perf_counter() - started) * 1000, 3)
+            logger.debug("Обработчик %s: %s мс", name, duration_ms,
+                         extra={"handler": name, "user_id": request.user_id, "duration_ms": duration_ms})
+        return True
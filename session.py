@@ -0,0 +1,79 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+UNKNOWN = "Неизвестно"
+
+
+class Session:
+    """Сессия младшего администратора.
+
+    __slots__ вместо словаря: без dict на каждую запись и без строковых
+    ключей в каждой. Имена интернируются — одинаковые имена у разных
+    пользователей хранятся одной строкой. В файлах и базах запись
+    сохраняется в прежнем формате словаря (to_dict).
+    """
+
+    __slots__ = ("start_time", "first_name", "last_name")
+
+    def __init__(self, start_time, first_name=UNKNOWN, last_name=UNKNOWN):
+        self.start_time = float(start_time)
+        self.first_name = sys.intern(first_name)
+        self.last_name = sys.intern(last_name)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Сессия из словаря {"start_time", "first_name", "last_name"}"""
+        if isinstance(data, cls):
+            return data
+        return cls(data.get("start_time", 0), data.get("first_name", UNKNOWN), data.get("last_name", UNKNOWN))
+
+    def to_dict(self):
+        return {"start_time": self.start_time, "first_name": self.first_name, "last_name": self.last_name}
+
+    def __repr__(self):
+        return f"Session({self.start_time!r}, {self.first_name!r}, {self.last_name!r})"
+
+
+class PendingInput:
+    """Ожидаемый ввод пользователя (диалоги руководства) со сроком жизни.
+
+    Брошенный диалог забывается через ttl секунд. Срок у всех записей
+    одинаковый, поэтому порядок добавления совпадает с порядком истечения,
+    и устаревшие записи снимаются с начала за O(1) на запись.
+    """
+
+    def __init__(self, ttl=300, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = OrderedDict()  # user_id -> (истекает, действие)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def set(self, user_id, action):
+        """Ожидание ввода для действия action"""
+        now = time.monotonic()
+        with self._lock:
+            self._items.pop(user_id, None)
+            self._items[user_id] = (now + self.ttl, action)
+            self._evict(now)
+
+    def pop(self, user_id):
+        """Ожидаемое действие (или None) — запись удаляется"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._items.pop(user_id, None)
+            self._evict(now)
+        if entry is None or entry[0] < now:
+            return None
+        return entry[1]
+
+    def _evict(self, now):
+        while self._items:
+            expires, _ = next(iter(self._items.values()))
+            if expires >= now and len(self._items) <= self.max_size:
+                break
+            self._items.popitem(last=False)
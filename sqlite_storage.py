@@ -0,0 +1,110 @@
+import sys
+import sqlite3
+import logging
+import threading
+
+from storage import Storage, JsonStorage
+from session import Session
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id INTEGER PRIMARY KEY,
+    start_time REAL NOT NULL,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_start_time ON sessions (start_time);
+
+CREATE TABLE IF NOT EXISTS roles (
+    role TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (role, user_id)
+);
+CREATE INDEX IF NOT EXISTS roles_user_id ON roles (user_id);
+"""
+
+# Запросы — постоянные строки с параметрами: sqlite3 компилирует их один раз
+# и берет из кэша подготовленных выражений соединения
+UPSERT_SESSION = ("INSERT OR REPLACE INTO sessions (user_id, start_time, first_name, last_name) "
+                  "VALUES (?, ?, ?, ?)")
+DELETE_SESSION = "DELETE FROM sessions WHERE user_id = ?"
+SELECT_SESSIONS = "SELECT user_id, start_time, first_name, last_name FROM sessions"
+INSERT_ROLE = "INSERT INTO roles (role, user_id, position) VALUES (?, ?, ?)"
+DELETE_ROLE = "DELETE FROM roles WHERE role = ?"
+SELECT_ROLE = "SELECT user_id FROM roles WHERE role = ? ORDER BY position"
+
+
+class SqliteStorage(Storage):
+    """Хранилище в SQLite (WAL) с индексами по пользователю и времени входа.
+
+    Поведение совпадает с JSON-хранилищем: load() возвращает admins со
+    строковыми ключами и списки ролей из int в порядке добавления.
+    """
+
+    def __init__(self, path="bot.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, cached_statements=64)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def load(self):
+        with self._lock:
+            admins = {
+                str(user_id): {"start_time": start_time, "first_name": first_name, "last_name": last_name}
+                for user_id, start_time, first_name, last_name in self.conn.execute(SELECT_SESSIONS)
+            }
+            roles = [[row[0] for row in self.conn.execute(SELECT_ROLE, (role,))] for role in self.ROLES]
+        logger.info("Состояние загружено из %s", self.path)
+        return (admins, *roles)
+
+    def save_admins(self, admins, user_ids=None):
+        with self._lock, self.conn:
+            if user_ids is None:
+                self.conn.execute("DELETE FROM sessions")
+                user_ids = list(admins)
+            for user_id in user_ids:
+                info = admins.get(str(user_id))
+                if info is None:
+                    self.conn.execute(DELETE_SESSION, (int(user_id),))
+                else:
+                    self.conn.execute(UPSERT_SESSION, (int(user_id), info.start_time,
+                                                       info.first_name, info.last_name))
+
+    def save_role(self, role, user_ids):
+        with self._lock, self.conn:
+            self.conn.execute(DELETE_ROLE, (role,))
+            self.conn.executemany(INSERT_ROLE, [(role, int(uid), i) for i, uid in enumerate(user_ids)])
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def migrate_from_json(db_path="bot.db", **json_options):
+    """Однократный перенос admins/senior_admins/management из JSON в SQLite"""
+    admins, senior_admins, management = JsonStorage(**json_options).load()
+    # Из файла приходят словари, save_admins ожидает записи Session
+    admins = {uid: Session.from_dict(info) for uid, info in admins.items()}
+    target = SqliteStorage(db_path)
+    try:
+        existing = target.load()
+        if any(existing):
+            raise RuntimeError(f"База {db_path} уже содержит данные, перенос отменен")
+        target.save_admins(admins)
+        target.save_role("senior_admins", senior_admins)
+        target.save_role("management", management)
+    finally:
+        target.close()
+    logger.info("Перенесено: %s сессий, %s старших администраторов, %s руководства",
+                len(admins), len(senior_admins), len(management))
+
+
+if __name__ == "__main__":
+    # python sqlite_storage.py [bot.db] — перенос JSON-файлов из текущей папки
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    migrate_from_json(sys.argv[1] if len(sys.argv) > 1 else "bot.db")
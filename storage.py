@@ -0,0 +1,278 @@
+import os
+import json
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from session import PendingInput
+
+logger = logging.getLogger(__name__)
+
+
+def encode_record(obj):
+    """Запись (например, Session) в JSON через ее to_dict()"""
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_dict()
+
+
+def write_json_atomic(path, data, indent=2):
+    """Атомарная запись JSON: временный файл + fsync + rename (indent=None — компактно)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            separators = (",", ":") if indent is None else None
+            json.dump(data, f, ensure_ascii=False, indent=indent, separators=separators,
+                      default=encode_record)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Фиксируем rename в каталоге (на платформах, где это поддерживается)
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class JsonStore:
+    """JSON-файл с отложенной (объединяющей изменения) атомарной записью.
+
+    Изменения накапливаются не дольше delay секунд или до max_pending штук,
+    после чего данные записываются одним снимком. В режиме журнала изменение
+    одного ключа словаря дописывается строкой в файл <path>.journal, а полный
+    снимок делается только при уплотнении (каждые compact_every записей).
+    """
+
+    def __init__(self, path, default, delay=1.0, max_pending=50, journal=False, compact_every=1000):
+        self.path = path
+        self.default = default
+        self.delay = delay
+        self.max_pending = max_pending
+        self.journal = journal
+        self.compact_every = compact_every
+        self.journal_path = path + ".journal"
+        self.data = None
+
+        self._lock = threading.RLock()
+        self._timer = None
+        self._pending = 0
+        self._journal_file = None
+        self._journal_len = 0
+        self._journal_dirty = False
+
+    # ==== Загрузка ====
+    def load(self):
+        """Чтение снимка и применение журнала"""
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+        else:
+            self.data = self.default()
+            logger.info("Файл %s не найден, используется пустое значение", self.path)
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Недописанная строка после сбоя — дальше ничего нет
+                        logger.warning("Поврежденная запись в %s пропущена", self.journal_path)
+                        break
+                    if "v" in record:
+                        self.data[record["k"]] = record["v"]
+                    else:
+                        self.data.pop(record["k"], None)
+                    self._journal_len += 1
+            if self._journal_len:
+                logger.info("Применено %s записей журнала %s", self._journal_len, self.journal_path)
+
+        return self.data
+
+    # ==== Сохранение ====
+    def save(self, key=None):
+        """Отметить изменение данных.
+
+        key — изменившийся ключ словаря; в режиме журнала вместо полного
+        снимка дописывается одна запись.
+        """
+        with self._lock:
+            if self.journal and key is not None:
+                self._append(key)
+                if self._journal_len >= self.compact_every:
+                    self._write_snapshot()
+                    return
+            else:
+                self._pending += 1
+                if self._pending >= self.max_pending:
+                    self._write_snapshot()
+                    return
+
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Немедленная запись всех накопленных изменений"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending:
+                self._write_snapshot()
+            elif self._journal_dirty:
+                self._journal_file.flush()
+                os.fsync(self._journal_file.fileno())
+                self._journal_dirty = False
+
+    def close(self):
+        """Запись изменений и закрытие журнала (при остановке бота)"""
+        with self._lock:
+            self.flush()
+            if self._journal_file is not None:
+                self._journal_file.close()
+                self._journal_file = None
+
+    def _append(self, key):
+        """Дописывает изменение одного ключа в журнал"""
+        key = str(key)
+        record = {"k": key}
+        if key in self.data:
+            record["v"] = self.data[key]
+
+        if self._journal_file is None:
+            self._journal_file = open(self.journal_path, "a", encoding="utf-8")
+        self._journal_file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":"),
+                                            default=encode_record) + "\n")
+        self._journal_file.flush()
+        self._journal_len += 1
+        self._journal_dirty = True
+
+    def _write_snapshot(self):
+        """Полный снимок данных; в режиме журнала заодно уплотняет его"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        # Копирование dict/list выполняется атомарно относительно других потоков
+        snapshot = dict(self.data) if isinstance(self.data, dict) else list(self.data)
+        write_json_atomic(self.path, snapshot)
+        self._pending = 0
+
+        if self._journal_len:
+            if self._journal_file is not None:
+                self._journal_file.close()
+            self._journal_file = open(self.journal_path, "w", encoding="utf-8")
+            self._journal_len = 0
+            self._journal_dirty = False
+            logger.debug("Журнал %s уплотнен", self.journal_path)
+
+        logger.debug("Файл %s сохранен", self.path)
+
+
+# ==== Интерфейс хранилища ====
+class Storage:
+    """Хранилище состояния бота: сессии (admins) и списки ролей.
+
+    Роли — "senior_admins" и "management", как одноименные файлы и списки.
+    """
+
+    ROLES = ("senior_admins", "management")
+
+    def load(self):
+        """Загрузка состояния: (admins, senior_admins, management)"""
+        raise NotImplementedError
+
+    def save_admins(self, admins, user_ids=None):
+        """Сохранение сессий; user_ids — изменившиеся записи (None — все)"""
+        raise NotImplementedError
+
+    def save_role(self, role, user_ids):
+        """Сохранение списка пользователей роли"""
+        raise NotImplementedError
+
+    def claim_session(self, user_id, info):
+        """Атомарное начало сессии; False, если ее уже открыл другой процесс.
+
+        Локальные хранилища принадлежат одному процессу — всегда True.
+        """
+        return True
+
+    def release_session(self, user_id):
+        """Атомарное завершение сессии; False, если ее уже закрыл другой процесс"""
+        return True
+
+    def pending_input(self, ttl):
+        """Ожидаемый ввод пользователей (диалоги руководства).
+
+        Локальные хранилища держат его в памяти процесса.
+        """
+        return PendingInput(ttl=ttl)
+
+    def close(self):
+        """Запись отложенных изменений и освобождение ресурсов"""
+
+
+class JsonStorage(Storage):
+    """Хранилище в JSON-файлах (по умолчанию)"""
+
+    def __init__(self, admins_file="admins.json", senior_admins_file="senior_admins.json",
+                 management_file="management.json", journal=False, compact_every=1000, **options):
+        self.admins_store = JsonStore(admins_file, dict, journal=journal,
+                                      compact_every=compact_every, **options)
+        self.role_stores = {
+            "senior_admins": JsonStore(senior_admins_file, list, **options),
+            "management": JsonStore(management_file, list, **options),
+        }
+
+    def load(self):
+        # Файлы независимы — читаем параллельно (чтение и разбор журнала
+        # одного не ждут остальных)
+        stores = (self.admins_store, self.role_stores["senior_admins"], self.role_stores["management"])
+        with ThreadPoolExecutor(max_workers=len(stores)) as pool:
+            return tuple(pool.map(lambda store: store.load(), stores))
+
+    def save_admins(self, admins, user_ids=None):
+        if user_ids is None or not self.admins_store.journal:
+            self.admins_store.save()
+        else:
+            for user_id in user_ids:
+                self.admins_store.save(user_id)
+
+    def save_role(self, role, user_ids):
+        self.role_stores[role].save()
+
+    def close(self):
+        for store in (self.admins_store, *self.role_stores.values()):
+            try:
+                store.close()
+            except Exception as e:
+                logger.error("Ошибка сохранения %s: %s", store.path, e)
+
+
+def open_storage(backend="json", **options):
+    """Создание хранилища по имени бэкенда: json, sqlite или redis"""
+    if backend == "json":
+        return JsonStorage(**options)
+    if backend == "sqlite":
+        from sqlite_storage import SqliteStorage
+        return SqliteStorage(**options)
+    if backend == "redis":
+        from redis_storage import RedisStorage
+        return RedisStorage(**options)
+    raise ValueError(f"Неизвестный бэкенд хранилища: {backend}")
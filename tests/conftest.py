@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# Модули бота лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Руководитель в тестах с модулем bot
+MANAGER_ID = 1
+
+
+@pytest.fixture(scope="session")
+def bot(tmp_path_factory):
+    """Модуль bot.py с состоянием во временном каталоге и FakeVkApi"""
+    from bench import prepare_bot, attach_fake_api
+    from fake_vk import FakeVkApi
+
+    cwd = os.getcwd()
+    module = prepare_bot(str(tmp_path_factory.mktemp("bot")), [MANAGER_ID])
+    attach_fake_api(module, FakeVkApi())
+    yield module
+    # Отложенная запись состояния — в каталог теста, а не в рабочий
+    module.storage.close()
+    os.chdir(cwd)
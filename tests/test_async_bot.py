@@ -0,0 +1,161 @@
+import json
+import asyncio
+from urllib.parse import urlsplit, parse_qsl
+
+import pytest
+
+from async_http import AsyncHttpPool
+from fake_vk import FakeVkApi
+
+
+class FakeVkServer:
+    """VK API и long poll по HTTP на 127.0.0.1 (keep-alive, ответы через FakeVkApi).
+
+    updates — {group_id: [пачки событий]}; после пачек long poll отвечает пустыми
+    ответами. broken — сколько первых запросов ключа группы завершаются ошибкой 500.
+    """
+
+    def __init__(self, updates, broken=None):
+        self.updates = updates
+        self.broken = dict(broken or {})
+        self.api = FakeVkApi()
+        self.senders = set()   # токены, от имени которых отправлены сообщения
+        self.connections = 0
+        self.port = None
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                method, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                url = urlsplit(target)
+                values = dict(parse_qsl(url.query)) | dict(parse_qsl(body.decode()))
+                status, response = await self._respond(url.path, values)
+                data = json.dumps(response).encode()
+                # Ответы long poll — chunked, как у настоящего сервера
+                if url.path.startswith("/lp"):
+                    writer.write(f"HTTP/1.1 {status} OK\r\nTransfer-Encoding: chunked\r\n\r\n".encode()
+                                 + f"{len(data):x}\r\n".encode() + data + b"\r\n0\r\n\r\n")
+                else:
+                    writer.write(f"HTTP/1.1 {status} OK\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Клиент закрыл соединение или сервер останавливается
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, path, values):
+        if path.startswith("/lp/"):
+            group_id = int(path.rsplit("/", 1)[1])
+            batches = self.updates.get(group_id)
+            if not batches:
+                await asyncio.sleep(0.05)
+                return 200, {"ts": values["ts"], "updates": []}
+            return 200, {"ts": str(int(values["ts"]) + 1), "updates": batches.pop(0)}
+        method = path.rsplit("/", 1)[1]
+        if method == "groups.getLongPollServer":
+            group_id = int(values["group_id"])
+            if self.broken.get(group_id):
+                self.broken[group_id] -= 1
+                return 500, {}
+            return 200, {"response": {"key": "k", "server": f"http://127.0.0.1:{self.port}/lp/{group_id}",
+                                      "ts": "10"}}
+        if method in ("messages.send", "execute"):
+            self.senders.add(values["access_token"])
+        return 200, self.api.method(method, {k: v for k, v in values.items()
+                                             if k not in ("v", "access_token")}, raw=True)
+
+
+def message(group_id, from_id, text, event_id):
+    return {"type": "message_new", "group_id": group_id, "event_id": event_id,
+            "object": {"message": {"from_id": from_id, "peer_id": from_id, "text": text}, "client_info": {}}}
+
+
+def test_pool_reuses_keep_alive_connections():
+    async def scenario():
+        server = FakeVkServer({7: [[message(7, 5, "x", "e1")]]})
+        await server.start()
+        pool = AsyncHttpPool(4)
+        base = f"http://127.0.0.1:{server.port}"
+        first = await pool.request("GET", f"{base}/lp/7", params={"ts": "1"})
+        second = await pool.request("POST", f"{base}/method/users.get", data={"user_ids": "3"})
+        await pool.close()
+        await server.stop()
+        return server, first.json(), second.json()
+
+    server, first, second = asyncio.run(scenario())
+
+    assert first["ts"] == "2" and first["updates"][0]["event_id"] == "e1"
+    assert second["response"][0]["id"] == 3
+    assert server.connections == 1
+
+
+def test_runner_serves_groups_with_checkpoints(bot, tmp_path, monkeypatch):
+    import async_bot
+
+    monkeypatch.setenv("LONGPOLL_STATE", str(tmp_path / "state.json"))
+    updates = {
+        bot.GROUP_ID: [[message(bot.GROUP_ID, 501, "/start", "a1")],
+                       # Повтор уже полученного события отбрасывается
+                       [message(bot.GROUP_ID, 501, "/start", "a1")]],
+        77: [[message(77, 502, "/start", "b1"), message(77, 503, "/help", "b2")]],
+    }
+    server = FakeVkServer(updates, broken={77: 2})
+
+    async def scenario():
+        await server.start()
+        runner = async_bot.AsyncRunner([(bot.GROUP_ID, "token1"), (77, "token2")], workers=2)
+        for poll in runner.polls:
+            poll.vk_session.API_URL = f"http://127.0.0.1:{server.port}/method/"
+            poll.client.outbox.backoff = 0.01
+            poll.consumer.backoff = 0.01
+        task = asyncio.create_task(runner.run())
+        for _ in range(200):
+            if not any(updates.values()) and server.api.sent_messages >= 3:
+                break
+            await asyncio.sleep(0.02)
+        runner.stop()
+        await task
+        await server.stop()
+        return runner
+
+    runner = asyncio.run(scenario())
+
+    # Ответ уходит от имени группы, получившей событие; ошибка ключа одной группы не мешает другой
+    assert server.senders == {"token1", "token2"}
+    assert server.api.sent_messages == 3
+    assert runner.polls[1].consumer.reconnects == 1
+    with open(tmp_path / "state.json", encoding="utf-8") as f:
+        assert json.load(f)["ts"] == "12"
+    with open(tmp_path / "state_77.json", encoding="utf-8") as f:
+        assert json.load(f)["ts"] == "11"
+
+
+def test_sync_api_calls_inside_the_loop_are_rejected():
+    import async_bot
+
+    async def scenario():
+        session = async_bot.AsyncVkSession("token", AsyncHttpPool(1))
+        session.loop = asyncio.get_running_loop()
+        with pytest.raises(RuntimeError):
+            session.method("users.get")
+
+    asyncio.run(scenario())
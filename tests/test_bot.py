@@ -0,0 +1,104 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from conftest import MANAGER_ID
+from fake_vk import make_message_event
+from history import day_key
+
+
+class RecordingOutbox:
+    """Исходящие без потока: вызовы сохраняются и сразу считаются доставленными"""
+
+    def __init__(self):
+        self.calls = []
+
+    def send(self, method, values, on_done=None):
+        self.calls.append((method, values))
+        if on_done is not None:
+            on_done()
+
+    def messages(self):
+        return [values["message"] for method, values in self.calls if method == "messages.send"]
+
+
+@pytest.fixture
+def outbox(bot, monkeypatch):
+    recording = RecordingOutbox()
+    monkeypatch.setattr(bot.client, "outbox", recording)
+    return recording
+
+
+def send(bot, outbox, text, from_id=MANAGER_ID):
+    """Текст ответа бота на сообщение"""
+    before = len(outbox.calls)
+    bot.handle_event(make_message_event(from_id, text))
+    return "\n".join(outbox.messages()[before:])
+
+
+def test_day_accepts_unpadded_date(bot, outbox):
+    bot.history.record(5, 1767600000.0, 1767603600.0)
+    day = day_key(1767600000.0)
+    year, month, mday = day.split("-")
+
+    answer = send(bot, outbox, f"/day {year}-{int(month)}-{int(mday)}")
+
+    assert f"Итоги {day}" in answer
+    assert "Смен: 1" in answer
+
+
+def test_day_rejects_malformed_date(bot, outbox):
+    assert "Использование" in send(bot, outbox, "/day 2026-13-40")
+
+
+def test_malformed_digest_peer_ids_are_skipped(bot, caplog):
+    assert bot.parse_peer_ids("2000000001, x,2000000002,,3.5") == [2000000001, 2000000002]
+    assert "'x'" in caplog.text and "'3.5'" in caplog.text
+
+
+def test_addgroup_with_several_users(bot, outbox):
+    answer = send(bot, outbox, "/addgroup senior 101, @102 [id103|Имя] vk.com/id104 vk.com/durov 101 ???")
+
+    assert "Назначены старшим администратором: 5" in answer
+    assert "Не распознаны: 1\n???" in answer
+    durov = 1_000_000 + len("durov")
+    assert [bot.is_senior_admin(uid) for uid in (101, 102, 103, 104, durov)] == [True] * 5
+    assert bot.senior_admins.count(101) == 1
+
+    answer = send(bot, outbox, "/removegroup senior 101 102 105")
+    assert "Удалены из старших администраторов: 2" in answer
+    assert "Не являются старшим администратором: 1" in answer
+    assert not bot.is_senior_admin(101) and bot.is_senior_admin(103)
+
+
+def test_addgroup_junior_opens_sessions_for_each_user(bot, outbox):
+    answer = send(bot, outbox, "/addgroup junior 201 202")
+
+    assert "Назначены младшим администратором: 2" in answer
+    assert bot.is_junior_admin(201) and bot.is_junior_admin(202)
+    assert "201" in bot.get_junior_admins_list()
+    send(bot, outbox, "/removegroup junior 201 202")
+    assert not bot.is_junior_admin(201)
+
+
+def test_addgroup_is_ignored_for_non_management(bot, outbox):
+    answer = send(bot, outbox, "/addgroup senior 301 302", from_id=999)
+
+    assert answer == ""
+    assert not bot.is_senior_admin(301)
+
+
+def test_helpers_load_state_on_first_use(tmp_path):
+    (tmp_path / "management.json").write_text("[5]", encoding="utf-8")
+    (tmp_path / "senior_admins.json").write_text("[7]", encoding="utf-8")
+    code = ("import bot; assert bot.client is None and bot.roles is None; "
+            "print(bot.is_management(5), bot.get_user_role(7), len(bot.get_junior_admins_list()) > 0); "
+            "print(bot.client is None)")
+    env = dict(os.environ, VK_TOKEN="fake", GROUP_ID="1",
+               PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=60)
+
+    assert result.stdout.split() == ["True", "senior", "True", "True"], result.stderr
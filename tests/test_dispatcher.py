@@ -0,0 +1,43 @@
+import random
+import threading
+import time
+
+from dispatcher import Dispatcher
+
+
+def test_events_of_one_key_are_handled_in_order():
+    handled = {}
+    lock = threading.Lock()
+    rnd = random.Random(1)
+
+    def handler(item):
+        key, n = item
+        time.sleep(rnd.random() / 1000)
+        with lock:
+            handled.setdefault(key, []).append(n)
+
+    dispatcher = Dispatcher(handler, workers=4, max_pending=20)
+    for n in range(200):
+        key = n % 5
+        dispatcher.submit(key, (key, n))
+    dispatcher.shutdown()
+
+    assert sorted(handled) == list(range(5))
+    for key, items in handled.items():
+        assert items == list(range(key, 200, 5))
+
+
+def test_handler_error_does_not_stop_the_key():
+    handled = []
+
+    def handler(item):
+        if item == 1:
+            raise ValueError("сбой")
+        handled.append(item)
+
+    dispatcher = Dispatcher(handler, workers=2)
+    for item in range(3):
+        dispatcher.submit("key", item)
+    dispatcher.shutdown()
+
+    assert handled == [0, 2]
@@ -0,0 +1,24 @@
+from expiry import ExpiryScheduler
+
+
+def test_pop_due_returns_expired_in_order():
+    scheduler = ExpiryScheduler(10, on_expired=None)
+    scheduler.add(2, 5.0)
+    scheduler.add(1, 0.0)
+    scheduler.add(3, 50.0)
+
+    assert scheduler.pop_due(now=20.0) == [1, 2]
+    assert scheduler.next_due() == 60.0
+    assert len(scheduler) == 1
+
+
+def test_discarded_and_replaced_sessions_do_not_expire():
+    scheduler = ExpiryScheduler(10, on_expired=None)
+    scheduler.add(1, 0.0)
+    scheduler.add(2, 0.0)
+    scheduler.discard(1)
+    # Повторный вход: старая запись в куче устарела
+    scheduler.add(2, 100.0)
+
+    assert scheduler.pop_due(now=50.0) == []
+    assert scheduler.pop_due(now=110.0) == [2]
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from history import ShiftHistory
+
+
+@pytest.fixture(autouse=True)
+def utc(monkeypatch):
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def ts(day, hour):
+    return time.mktime(time.strptime(f"{day} {hour}", "%Y-%m-%d %H"))
+
+
+def test_shift_over_midnight_is_split_by_days(tmp_path):
+    history = ShiftHistory(str(tmp_path / "history.jsonl"))
+    history.record(1, ts("2026-01-05", 22), ts("2026-01-06", 3))
+
+    assert history.day_totals("2026-01-05") == (7200.0, 1, 1)
+    # Смена считается в дне начала, время — в обоих днях
+    assert history.day_totals("2026-01-06") == (3 * 3600.0, 0, 1)
+    assert history.user_stats(1, now=ts("2026-01-06", 12)) == (3 * 3600.0, 5 * 3600.0, 5 * 3600.0, 1)
+
+
+def test_top_and_max_duration(tmp_path):
+    history = ShiftHistory(str(tmp_path / "history.jsonl"), max_duration=3600)
+    history.record(1, ts("2026-01-05", 8), ts("2026-01-05", 9))
+    history.record(2, ts("2026-01-05", 8), ts("2026-01-05", 18))
+    history.record(3, ts("2026-01-05", 10), ts("2026-01-05", 10))
+
+    assert history.day_totals("2026-01-05") == (7200.0, 2, 2)
+    assert history.top("day", now=ts("2026-01-05", 20)) == [(1, 3600.0), (2, 3600.0)]
+    assert history.top("day", now=ts("2026-01-07", 20)) == []
+
+
+def test_load_rebuilds_aggregates_and_skips_torn_line(tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    history = ShiftHistory(path)
+    history.record(1, ts("2026-01-05", 8), ts("2026-01-05", 10))
+    history.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"u": 2, "s": 1')
+
+    loaded = ShiftHistory(path)
+    assert loaded.load() == 1
+    assert loaded.day_totals("2026-01-05") == (7200.0, 1, 1)
+    # Новая строка не склеивается с недописанной
+    loaded.record(3, ts("2026-01-05", 12), ts("2026-01-05", 13))
+    loaded.close()
+    again = ShiftHistory(path)
+    assert again.load() == 2
@@ -0,0 +1,68 @@
+import json
+
+from fake_vk import make_message_event
+from longpoll import LongPollConsumer
+
+
+class FakeLongPoll:
+    """VkBotLongPoll с заранее заданными ответами check(): пачки событий или исключения"""
+
+    def __init__(self, responses, ts=100):
+        self.responses = list(responses)
+        self.ts = ts
+        self.server_updates = []
+
+    def update_longpoll_server(self, update_ts=True):
+        self.server_updates.append(update_ts)
+
+    def check(self):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        self.ts += len(response)
+        return response
+
+
+def event(n):
+    return make_message_event(1, "x", event_id=f"e{n}")
+
+
+def consumer(longpoll, path):
+    return LongPollConsumer(lambda: longpoll, str(path), backoff=0.001, save_every=3600)
+
+
+def test_resume_skips_processed_and_redelivers_unprocessed(tmp_path):
+    path = tmp_path / "state.json"
+    first = consumer(FakeLongPoll([[event(1)], [event(2), event(3)]]), path)
+    events = first.listen()
+    first.done(next(events))            # e1
+    first.done(next(events))            # e2
+    next(events)                        # e3 получено, но не обработано
+    first.close()
+
+    state = json.loads(path.read_text(encoding="utf-8"))
+    # Позиция перед пачкой с e3; сохранен только обработанный e2 из нее
+    assert state == {"ts": 101, "event_ids": ["e2"]}
+
+    # Сервер с этой позиции повторно отдает e2 и e3
+    longpoll = FakeLongPoll([[event(2), event(3)]], ts=None)
+    second = consumer(longpoll, path)
+    assert next(second.listen()).raw["event_id"] == "e3"
+    assert longpoll.ts == 103
+
+
+def test_duplicates_are_dropped(tmp_path):
+    longpoll = FakeLongPoll([[event(1), event(2)], [event(2), event(3)]])
+    events = consumer(longpoll, tmp_path / "state.json").listen()
+
+    assert [next(events).raw["event_id"] for _ in range(3)] == ["e1", "e2", "e3"]
+
+
+def test_reconnect_keeps_position(tmp_path):
+    longpoll = FakeLongPoll([[event(1)], ConnectionError("сеть"), [event(2)]])
+    reader = consumer(longpoll, tmp_path / "state.json")
+    events = reader.listen()
+
+    assert [next(events).raw["event_id"] for _ in range(2)] == ["e1", "e2"]
+    assert longpoll.server_updates == [False]
+    assert reader.reconnects == 1
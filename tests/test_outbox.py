@@ -0,0 +1,75 @@
+from vk_api.exceptions import ApiError
+
+from fake_vk import FakeVkApi
+from outbox import Outbox
+
+
+class FailingVkApi(FakeVkApi):
+    """Первые failures запросов завершаются ошибкой VK с кодом code"""
+
+    def __init__(self, failures, code):
+        super().__init__()
+        self.failures = failures
+        self.code = code
+
+    def method(self, method, values=None, raw=False, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            with self._lock:
+                self.calls[method] += 1
+            raise ApiError(self, method, values, raw, {"error_code": self.code, "error_msg": "error"})
+        return super().method(method, values, raw, **kwargs)
+
+
+def send_all(vk_session, count, **kwargs):
+    outbox = Outbox(vk_session, rate=1000, backoff=0.001, **kwargs)
+    delivered = []
+    # Поток очереди ждет блокировку, пока не поставлены все вызовы: пачки предсказуемы
+    with outbox._cond:
+        for i in range(count):
+            outbox.send("messages.send", {"peer_id": i, "message": "x", "random_id": i},
+                        on_done=lambda i=i: delivered.append(i))
+    outbox.stop(timeout=10)
+    return outbox, delivered
+
+
+def test_calls_are_batched_into_execute():
+    fake = FakeVkApi()
+    outbox, delivered = send_all(fake, 30)
+
+    assert delivered == list(range(30))
+    assert fake.sent_messages == 30
+    # 25 + 5 вызовов
+    assert fake.calls == {"execute": 2}
+    assert outbox.stats() == {"queued": 0, "delivered": 30, "retried": 0, "dropped": 0}
+
+
+def test_flood_control_is_retried_in_order():
+    fake = FailingVkApi(failures=2, code=9)
+    outbox, delivered = send_all(fake, 3, max_retries=3)
+
+    assert delivered == [0, 1, 2]
+    assert outbox.retried == 6 and outbox.dropped == 0
+
+
+def test_calls_are_dropped_after_max_retries():
+    fake = FailingVkApi(failures=10, code=6)
+    outbox, delivered = send_all(fake, 2, max_retries=2)
+
+    assert delivered == []
+    assert outbox.dropped == 2 and outbox.retried == 4
+
+
+def test_non_retryable_error_drops_without_retry():
+    fake = FailingVkApi(failures=1, code=15)
+    outbox, delivered = send_all(fake, 2)
+
+    assert delivered == []
+    assert (outbox.dropped, outbox.retried) == (2, 0)
+
+
+def test_full_queue_drops_new_calls():
+    outbox = Outbox(FakeVkApi(), max_queue=0)
+    outbox.send("messages.send", {"peer_id": 1, "message": "x", "random_id": 1})
+
+    assert outbox.stats()["dropped"] == 1
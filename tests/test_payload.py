@@ -0,0 +1,35 @@
+import json
+
+from payload import PayloadDecoder
+
+
+def make_decoder(**options):
+    decoder = PayloadDecoder(**options)
+    decoder.set_known([json.dumps({"command": "entered"})])
+    return decoder
+
+
+def test_known_payload_comes_from_table():
+    decoder = make_decoder()
+    raw = json.dumps({"command": "entered"})
+
+    assert decoder.decode(raw) == {"command": "entered"}
+    assert decoder.decode(raw) is decoder.decode(raw)
+
+
+def test_other_payloads_are_parsed():
+    decoder = make_decoder()
+
+    assert decoder.decode('{"command": "junior_admins", "page": 2}') == {"command": "junior_admins", "page": 2}
+    assert decoder.decode({"command": "exited"}) == {"command": "exited"}
+    assert decoder.decode("") is None
+    assert decoder.decode(None) is None
+
+
+def test_bad_payloads_are_rejected():
+    decoder = make_decoder(max_size=32)
+
+    assert decoder.decode(json.dumps({"command": "x" * 40})) is None
+    assert decoder.decode("{command") is None
+    assert decoder.decode("[1, 2]") is None
+    assert decoder.decode(b'{"command": "entered"}') is None
@@ -0,0 +1,61 @@
+import gzip
+
+from recorder import Anonymizer, EventRecorder, load_recording, CHAT_PEER_OFFSET
+
+
+def test_ids_keep_their_kind_and_are_stable():
+    anonymizer = Anonymizer(b"salt")
+    user = anonymizer.user_id(12345)
+
+    assert user == anonymizer.user_id("12345")
+    assert user != Anonymizer(b"other").user_id(12345)
+    assert 100000000 <= user < 1000000000
+    assert anonymizer.user_id(CHAT_PEER_OFFSET + 7) > CHAT_PEER_OFFSET
+    assert anonymizer.user_id(-5) < 0
+
+
+def test_command_arguments_after_the_group_are_pseudonymized():
+    anonymizer = Anonymizer(b"salt")
+    text = anonymizer.text("/addgroup senior durov @team vk.com/id42 12345 [id7|Павел Дуров] a,b")
+    words = text.split()
+
+    assert words[:2] == ["/addgroup", "senior"]
+    for secret in ("durov", "team", "42", "12345", "Павел", " a,", ",b"):
+        assert secret not in text
+    assert words[2].startswith("u") and words[3].startswith("@u")
+    assert words[4].startswith("vk.com/id")
+    assert words[6].startswith("[id") and words[6].endswith("|user]")
+    assert words[7].count(",") == 1
+    # Одно и то же имя — один псевдоним, регистр не важен
+    assert anonymizer.text("/removegroup senior DUROV").split()[2] == words[2]
+
+
+def test_command_parameters_and_plain_text():
+    anonymizer = Anonymizer(b"salt")
+
+    assert anonymizer.text("/day 2026-01-05") == "/day 2026-01-05"
+    assert anonymizer.text("/top week") == "/top week"
+    assert "777" not in anonymizer.text("/addgroup 777")
+    assert anonymizer.text("привет всем") == "****** ****"
+
+
+def test_recording_round_trip(tmp_path):
+    path = str(tmp_path / "events.jsonl.gz")
+    recorder = EventRecorder(path, management_ids=[1], salt=b"salt")
+
+    class Event:
+        raw = {"type": "message_new", "event_id": "e1", "object": {"message": {
+            "from_id": 5, "peer_id": 5, "text": "/addgroup junior durov",
+            "attachments": [{"type": "doc", "doc": {"url": "secret"}}]}}}
+
+    recorder.record(Event())
+    recorder.close()
+    header, records = load_recording(path)
+
+    anonymizer = Anonymizer(b"salt")
+    assert header["management"] == [anonymizer.user_id(1)]
+    message = records[0]["event"]["object"]["message"]
+    assert message["from_id"] == anonymizer.user_id(5)
+    assert message["attachments"] == [{"type": "doc"}]
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert "durov" not in f.read()
@@ -0,0 +1,103 @@
+import time
+import threading
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from redis_storage import RedisStorage
+from session import Session
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def open_instance(server):
+    # Отдельный процесс бота: свой клиент и instance_id, общий сервер
+    return RedisStorage(prefix="test:", client=fakeredis.FakeRedis(server=server))
+
+
+def test_session_claimed_and_released_once(server):
+    first, second = open_instance(server), open_instance(server)
+    info = Session(100.0, "Иван", "Петров")
+
+    assert first.claim_session(5, info)
+    assert not second.claim_session(5, info)
+    assert second.load_session(5).get("first_name") == "Иван"
+
+    assert second.release_session(5)
+    assert not first.release_session(5)
+    assert first.load_sessions() == {}
+
+
+def test_changes_delivered_to_other_instances(server):
+    first, second = open_instance(server), open_instance(server)
+    received = []
+    delivered = threading.Event()
+
+    def on_change(kind, user_id):
+        received.append((kind, user_id))
+        delivered.set()
+
+    first.subscribe(on_change)
+    try:
+        # Свое изменение не возвращается отправителю
+        first.save_role("management", [1])
+        second.save_role("senior_admins", [3, 2])
+        assert delivered.wait(5)
+    finally:
+        first.close()
+
+    assert received == [("senior_admins", None)]
+    assert first.load_role("senior_admins") == [3, 2]
+
+
+def test_pending_input_shared_between_instances(server):
+    first, second = open_instance(server), open_instance(server)
+    first.pending_input(ttl=60).set("7", "add_senior")
+
+    waiting = second.pending_input(ttl=60)
+    assert waiting.pop("7") == "add_senior"
+    assert waiting.pop("7") is None
+
+
+def test_pending_input_expires(server):
+    waiting = open_instance(server).pending_input(ttl=0.05)
+    waiting.set("7", "add_senior")
+    time.sleep(0.1)
+
+    assert waiting.pop("7") is None
+
+
+def test_leader_lock_is_exclusive(server):
+    first, second = open_instance(server), open_instance(server)
+    leader = first.leader_lock(ttl=30)
+    follower = second.leader_lock(ttl=30)
+
+    assert leader.acquire(blocking=False)
+    assert not follower.acquire(blocking=False)
+    assert leader.renew()
+
+    # Чужой ключ release не снимает
+    follower.release()
+    assert not second.leader_lock(ttl=30).acquire(blocking=False)
+    leader.release()
+    assert second.leader_lock(ttl=30).acquire(blocking=False)
+
+
+def test_lost_leadership_calls_on_lost(server):
+    lost = threading.Event()
+    storage = open_instance(server)
+    leader = storage.leader_lock(ttl=0.3, on_lost=lost.set)
+    assert leader.acquire(blocking=False)
+
+    # Ключ истек, и ведущим стал другой процесс
+    storage.client.set(leader.key, "other")
+
+    assert lost.wait(5)
+    assert leader.lost.is_set()
+    assert not leader.renew()
+    leader.release()
+    assert storage.client.get(leader.key) == b"other"
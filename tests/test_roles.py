@@ -0,0 +1,53 @@
+from roles import RoleRegistry
+from session import Session
+
+
+def make_registry(admins=None, senior=None, management=None):
+    return RoleRegistry(admins or {}, senior or [], management or [])
+
+
+def test_ids_are_deduplicated_and_normalized_to_int():
+    admins = {5: {"start_time": 1.0, "first_name": "А", "last_name": "Б"}}
+    senior = [1, "1", "2", 2]
+    management = [3]
+    roles = make_registry(admins, senior, management)
+
+    assert senior == [1, 2]
+    assert roles.normalized == ["senior"]
+    assert list(admins) == ["5"]
+    assert isinstance(admins["5"], Session)
+    assert roles.count("senior") == 2
+    assert roles.count("management") == 1
+    assert roles.count("junior") == 1
+
+
+def test_role_priority_and_lookups_accept_str_ids():
+    roles = make_registry(senior=[1, 2], management=[1])
+
+    assert roles.role_of("1") == "management"
+    assert roles.role_of(2) == "senior"
+    assert roles.role_of(3) == "none"
+    assert roles.has("senior", "1")
+
+
+def test_add_and_remove_keep_counts_and_source_lists():
+    admins, senior = {}, []
+    roles = RoleRegistry(admins, senior, [])
+    events = []
+    roles.add_listener(lambda role, uid, added, info: events.append((role, uid, added)))
+
+    assert roles.add("senior", "7")
+    assert not roles.add("senior", 7)
+    assert roles.add("junior", 7, {"start_time": 1.0, "first_name": "А", "last_name": "Б"})
+    assert senior == [7] and "7" in admins
+    assert roles.count("senior") == 1 and roles.count("junior") == 1
+    assert roles.role_of(7) == "senior"
+
+    assert roles.remove("senior", 7)
+    assert not roles.remove("senior", 7)
+    assert roles.role_of(7) == "junior"
+    assert roles.remove("junior", "7")
+    assert roles.role_of(7) == "none"
+    assert senior == [] and admins == {}
+    assert roles.count("senior") == 0 and roles.count("junior") == 0
+    assert events == [("senior", 7, True), ("junior", 7, True), ("senior", 7, False), ("junior", 7, False)]
@@ -0,0 +1,42 @@
+from roster import Roster
+from session import Session
+
+
+def make_roster(count, page_size=3):
+    roster = Roster(lambda seconds: f"{int(seconds)}с", page_size=page_size)
+    for uid in range(1, count + 1):
+        roster.add(uid, Session(100.0 + uid, f"Имя{uid}", f"Фамилия{uid}"))
+    return roster
+
+
+def test_pages_are_numbered_across_the_list():
+    roster = make_roster(7)
+
+    lines, page, pages = roster.render_page(2, now=200.0)
+
+    assert (page, pages) == (2, 3)
+    assert lines == [
+        "4. [id4|Имя4 Фамилия4] — ⏱ 96с",
+        "5. [id5|Имя5 Фамилия5] — ⏱ 95с",
+        "6. [id6|Имя6 Фамилия6] — ⏱ 94с",
+    ]
+    assert roster.render_page(3, now=200.0)[0] == ["7. [id7|Имя7 Фамилия7] — ⏱ 93с"]
+
+
+def test_page_number_is_clamped():
+    roster = make_roster(4)
+
+    assert roster.render_page(10, now=200.0)[1:] == (2, 2)
+    assert roster.render_page(0, now=200.0)[1:] == (1, 2)
+    assert Roster(str).render_page(3, now=0.0) == ([], 1, 1)
+
+
+def test_role_changes_keep_the_entry_order():
+    roster = make_roster(3)
+    roster.on_role_change("junior", 2, False, None)
+    roster.on_role_change("senior", 3, False, None)
+    roster.on_role_change("junior", 9, True, Session(150.0, "Имя9", "Фамилия9"))
+
+    lines, total = roster.render_since(10)
+    assert total == len(roster) == 3
+    assert [line.split()[1] for line in lines] == ["[id1|Имя1", "[id3|Имя3", "[id9|Имя9"]
@@ -0,0 +1,78 @@
+import json
+import os
+
+import pytest
+
+from session import Session
+from storage import JsonStore, write_json_atomic
+
+
+def open_store(path, **options):
+    # Большая задержка: снимок пишется только явно (flush/уплотнение)
+    store = JsonStore(str(path), dict, delay=3600, journal=True, **options)
+    store.load()
+    return store
+
+
+def test_journal_replayed_after_crash(tmp_path):
+    path = tmp_path / "admins.json"
+    store = open_store(path)
+    store.data["1"] = {"start_time": 1}
+    store.save("1")
+    store.data["2"] = {"start_time": 2}
+    store.save("2")
+    store.data.pop("1")
+    store.save("1")
+    store.flush()
+    # Процесс "упал": снимка нет, только журнал
+    assert not path.exists()
+
+    assert open_store(path).data == {"2": {"start_time": 2}}
+
+
+def test_torn_journal_line_is_ignored(tmp_path):
+    path = tmp_path / "admins.json"
+    store = open_store(path)
+    store.data["1"] = {"start_time": 1}
+    store.save("1")
+    store.flush()
+    with open(store.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"k":"2","v":{"start_ti')
+
+    assert open_store(path).data == {"1": {"start_time": 1}}
+
+
+def test_compaction_writes_snapshot_and_truncates_journal(tmp_path):
+    path = tmp_path / "admins.json"
+    store = open_store(path, compact_every=3)
+    for uid in ("1", "2", "3"):
+        store.data[uid] = {"start_time": int(uid)}
+        store.save(uid)
+
+    assert json.loads(path.read_text(encoding="utf-8")) == store.data
+    assert os.path.getsize(store.journal_path) == 0
+
+    store.data["4"] = {"start_time": 4}
+    store.save("4")
+    store.close()
+    assert open_store(path).data == {uid: {"start_time": int(uid)} for uid in ("1", "2", "3", "4")}
+
+
+def test_session_records_are_saved_as_dicts(tmp_path):
+    path = tmp_path / "admins.json"
+    store = open_store(path)
+    store.data["5"] = Session(10.0, "Имя", "Фамилия")
+    store.save("5")
+    store.close()
+
+    assert open_store(path).data == {"5": {"start_time": 10.0, "first_name": "Имя", "last_name": "Фамилия"}}
+
+
+def test_failed_atomic_write_keeps_previous_file(tmp_path):
+    path = tmp_path / "data.json"
+    write_json_atomic(str(path), [1, 2])
+    with pytest.raises(TypeError):
+        write_json_atomic(str(path), [object()])
+
+    assert json.loads(path.read_text(encoding="utf-8")) == [1, 2]
+    assert os.listdir(tmp_path) == ["data.json"]
@@ -0,0 +1,68 @@
+from user_cache import UserCache, UNKNOWN_NAME
+
+
+class FakeUsersGet:
+    """users.get: имена по ID и по коротким именам, с журналом вызовов"""
+
+    def __init__(self, screen_names=None):
+        self.screen_names = screen_names or {}
+        self.calls = []
+
+    def __call__(self, user_ids, fields=None):
+        self.calls.append(user_ids)
+        users = []
+        for ref in user_ids.split(","):
+            uid = self.screen_names.get(ref.lower()) or int(ref)
+            user = {"id": uid, "first_name": f"Имя{uid}", "last_name": f"Фамилия{uid}"}
+            if fields:
+                user["screen_name"] = ref.lower()
+            users.append(user)
+        return users
+
+
+def test_misses_are_fetched_in_one_call_per_chunk(monkeypatch):
+    monkeypatch.setattr("user_cache.USERS_GET_LIMIT", 3)
+    fetch = FakeUsersGet()
+    cache = UserCache(fetch)
+
+    names = cache.get_many([1, 2, 2, 3, 4, "5"])
+
+    assert fetch.calls == ["1,2,3", "4,5"]
+    assert names[5] == ("Имя5", "Фамилия5")
+    assert (cache.hits, cache.misses) == (0, 5)
+
+
+def test_cached_names_do_not_call_the_api():
+    fetch = FakeUsersGet()
+    cache = UserCache(fetch)
+    cache.get_many([1, 2])
+
+    assert cache.get_many([2, 1]) == {1: ("Имя1", "Фамилия1"), 2: ("Имя2", "Фамилия2")}
+    assert cache.get(3) == ("Имя3", "Фамилия3")
+    assert fetch.calls == ["1,2", "3"]
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_expired_entries_are_fetched_again():
+    fetch = FakeUsersGet()
+    cache = UserCache(fetch, ttl=-1)
+    cache.get(1)
+    cache.get(1)
+
+    assert fetch.calls == ["1", "1"]
+
+
+def test_fetch_error_returns_unknown_name():
+    def failing(user_ids, fields=None):
+        raise RuntimeError("API недоступен")
+
+    assert UserCache(failing).get_many([7]) == {7: UNKNOWN_NAME}
+
+
+def test_screen_names_are_resolved_once():
+    fetch = FakeUsersGet({"durov": 1, "team": 2})
+    cache = UserCache(fetch)
+
+    assert cache.resolve_many(["Durov", "team", "durov"]) == {"durov": 1, "team": 2}
+    assert cache.resolve("DUROV") == 1
+    assert fetch.calls == ["Durov,team"]
@@ -0,0 +1,142 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Максимальное количество user_ids в одном вызове users.get
+USERS_GET_LIMIT = 1000
+
+UNKNOWN_NAME = ("Неизвестно", "Неизвестно")
+
+
+class UserCache:
+    """Кэш имен пользователей VK с TTL и вытеснением по LRU.
+
+    fetch(user_ids, fields=None) — функция, принимающая строку user_ids
+    через запятую и возвращающая список пользователей в формате users.get.
+    """
+
+    def __init__(self, fetch, ttl=3600, max_size=5000):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_size = max_size
+        self._names = OrderedDict()         # user_id -> (истекает, имя, фамилия)
+        self._screen_names = OrderedDict()  # screen_name -> (истекает, user_id)
+        self._lock = threading.Lock()  # запросы к VK выполняются вне блокировки
+        self.hits = 0
+        self.misses = 0
+
+    def _get_fresh(self, storage, key, now):
+        """Возвращает запись из кэша, если она не устарела"""
+        with self._lock:
+            entry = storage.get(key)
+            if entry is None:
+                return None
+            if entry[0] < now:
+                del storage[key]
+                return None
+            storage.move_to_end(key)
+            return entry
+
+    def _put(self, storage, key, value):
+        """Добавляет запись и вытесняет самые старые при переполнении"""
+        with self._lock:
+            storage[key] = (time.time() + self.ttl,) + value
+            storage.move_to_end(key)
+            while len(storage) > self.max_size:
+                storage.popitem(last=False)
+
+    def _count(self, hits, misses):
+        """Учет попаданий и промахов (get_many вызывается из разных потоков)"""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def _store_users(self, users):
+        """Кэширует ответ users.get"""
+        for user in users:
+            self._put(self._names, user["id"], (user["first_name"], user["last_name"]))
+
+    def get(self, user_id):
+        """Имя и фамилия одного пользователя"""
+        try:
+            key = int(user_id)
+        except (TypeError, ValueError):
+            return UNKNOWN_NAME
+        return self.get_many([key])[key]
+
+    def get_many(self, user_ids):
+        """Имена пользователей одним запросом users.get на каждые USERS_GET_LIMIT промахов.
+
+        Возвращает словарь {int(user_id): (имя, фамилия)}.
+        """
+        now = time.time()
+        result = {}
+        missing = []
+        for user_id in user_ids:
+            key = int(user_id)
+            if key in result:
+                continue
+            entry = self._get_fresh(self._names, key, now)
+            if entry is None:
+                result[key] = UNKNOWN_NAME
+                missing.append(key)
+            else:
+                result[key] = entry[1:]
+        self._count(len(result) - len(missing), len(missing))
+
+        for i in range(0, len(missing), USERS_GET_LIMIT):
+            chunk = missing[i:i + USERS_GET_LIMIT]
+            try:
+                users = self.fetch(",".join(str(uid) for uid in chunk))
+            except Exception as e:
+                logger.error("Ошибка получения информации о пользователях %s: %s", chunk, e)
+                continue
+            self._store_users(users)
+            for user in users:
+                result[user["id"]] = (user["first_name"], user["last_name"])
+
+        return result
+
+    def resolve(self, screen_name):
+        """Получение ID пользователя по короткому имени (или None)"""
+        return self.resolve_many([screen_name]).get(screen_name.lower())
+
+    def resolve_many(self, screen_names):
+        """ID пользователей по коротким именам одним запросом users.get на каждые USERS_GET_LIMIT промахов.
+
+        Возвращает словарь {короткое имя в нижнем регистре: user_id};
+        нераспознанных имен в нем нет.
+        """
+        now = time.time()
+        result = {}
+        missing = {}
+        for screen_name in screen_names:
+            key = screen_name.lower()
+            if key in result or key in missing:
+                continue
+            entry = self._get_fresh(self._screen_names, key, now)
+            if entry is None:
+                missing[key] = screen_name
+            else:
+                result[key] = entry[1]
+        self._count(len(result), len(missing))
+
+        keys = list(missing)
+        for i in range(0, len(keys), USERS_GET_LIMIT):
+            chunk = keys[i:i + USERS_GET_LIMIT]
+            try:
+                users = self.fetch(",".join(missing[key] for key in chunk), fields="screen_name")
+            except Exception as e:
+                logger.error("Ошибка получения пользователей по именам %s: %s", chunk, e)
+                continue
+            self._store_users(users)
+            for user in users:
+                key = str(user.get("screen_name", "")).lower()
+                if key in missing:
+                    result[key] = user["id"]
+                    self._put(self._screen_names, key, (user["id"],))
+
+        return result